@@ -1,17 +1,28 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import ui, SelectOption
 import os
 from dotenv import load_dotenv
 import asyncio
+import functools
 import sqlite3
+import sys
 from datetime import datetime
 from googletrans import Translator as GoogleTranslator
 import logging
-from contextlib import closing
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from functools import lru_cache
 import hashlib
+import heapq
+import itertools
+import re
+import threading
+import time
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import DictCursor, execute_values
 from urllib.parse import urlparse
 import random
 import deepl
@@ -29,6 +40,140 @@ logger = logging.getLogger(__name__)
 COOLDOWN_SECONDS = 5
 MAX_TRANSLATIONS_PER_MESSAGE = 5  # Limit translations to prevent spam
 
+# In-memory translation cache - TTL matches the translation_cache table
+CACHE_TTL_SECONDS = 24 * 60 * 60
+CACHE_MAX_ENTRIES = 10000
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+# Cheap-tier translations (load shedding, degraded guilds) stay in memory only and briefly,
+# so full-quality requests translate again once load drops
+CHEAP_CACHE_TTL_SECONDS = 10 * 60
+CHEAP_CACHE_MAX_ENTRIES = 2000
+CHEAP_CACHE_MAX_BYTES = 4 * 1024 * 1024
+
+# Write-behind for the translation_cache table - new rows are queued and upserted in batches
+TRANSLATION_FLUSH_SECONDS = 5
+TRANSLATION_FLUSH_SIZE = 200  # Flush early once this many rows are queued
+TRANSLATION_PENDING_MAX = 5000  # While the database is unreachable, rows beyond this stay memory-only
+
+# Segment-level translation memory - longer messages are cached per sentence/line
+SEGMENT_MIN_CHARS = 80  # Shorter messages are cached whole
+
+# translation_cache table maintenance - expired rows are deleted in small batches
+CACHE_PURGE_MINUTES = 15
+CACHE_PURGE_BATCH = 1000  # Rows per DELETE
+CACHE_PURGE_MAX_BATCHES = 50  # Per run, so one run never holds the database for long
+CACHE_STORE_ORIGINAL_TEXT = True  # Lookups never read original_text; False stores NULL there instead
+
+# User language index - every preference is held in memory while the table has at most this many rows
+USER_INDEX_MAX_ENTRIES = 200000
+USER_INDEX_BATCH_SIZE = 500  # user_ids per batched lookup when the index is partial
+USER_PREF_FLUSH_SECONDS = 30  # Role-derived preference changes are upserted in batches this often
+
+# PostgreSQL connection pool
+DB_POOL_MIN = 1
+DB_POOL_MAX = 10
+DB_POOL_TIMEOUT = 10  # Seconds to wait for a free connection
+DB_HEALTH_CHECK_IDLE = 30  # Ping connections that sat idle longer than this (seconds)
+
+# SQLite fallback (local / single-node deployments)
+SQLITE_PATH = 'translations.db'
+SQLITE_MAINTENANCE_MINUTES = 30  # WAL checkpoint + incremental vacuum interval
+
+# Re-read channel_settings this often so replicas pick up each other's !auto changes (0 = off)
+CHANNEL_RECONCILE_SECONDS = 0
+
+# Async translation service - blocking provider/DB calls run on this many threads
+TRANSLATION_WORKERS = 8  # Database and detection calls; provider calls have their own pool (PROVIDER_WORKERS)
+TRANSLATION_TIMEOUT = 8  # Seconds before a provider call is abandoned
+DETECTION_TIMEOUT = 4
+DB_TIMEOUT = 5
+
+# Offline language detection - below this confidence Google's detector is asked instead
+LOCAL_DETECTION_MIN_CONFIDENCE = 0.35
+DETECTION_CACHE_MAX_ENTRIES = 5000  # Detections memoized by normalized text ("gm", "lol", announcements)
+DETECTION_CACHE_MAX_BYTES = 4 * 1024 * 1024
+
+# Author/channel language priors - skip detection when recent history is this one-sided
+PRIOR_AUTHOR_WINDOW = 20  # Recent detections remembered per author
+PRIOR_CHANNEL_WINDOW = 100  # ... and per channel
+PRIOR_MIN_SAMPLES = 8
+PRIOR_MIN_SHARE = 0.9
+PRIOR_TOP_GUESSES = 2  # The prior must be one of the offline detector's best N guesses
+PRIOR_MAX_AUTHORS = 20000  # Histories kept (least recently active dropped first)
+PRIOR_MAX_CHANNELS = 5000
+PRIOR_TTL_SECONDS = 7 * 24 * 3600  # ... and forgotten after a week of silence
+PRIOR_AUDIT_RATE = 0.05  # Fraction of skipped detections re-checked to measure prior accuracy
+
+# Per-message fan-out: target languages translated in parallel
+TRANSLATION_FANOUT_LIMIT = 4
+FANOUT_TIMEOUT = TRANSLATION_TIMEOUT  # Send whatever finished by then
+
+# Priority lanes - interactive requests (!translate, context menu) go ahead of auto-translation
+PROVIDER_CONCURRENCY = 6  # Batches in flight to providers
+# Provider calls run on their own pool: a hedge doubles a batch's threads, and an abandoned call keeps
+# its thread until the provider timeout, so a stalled provider must not starve database calls
+PROVIDER_WORKERS = 2 * PROVIDER_CONCURRENCY
+LANES = {
+    # lane: (priority - lower is served first, latency target in seconds)
+    'interactive': (0, 3),
+    'auto': (1, FANOUT_TIMEOUT),
+}
+LANE_LATENCY_WINDOW = 200  # Recent latencies kept per lane for percentiles
+
+# Load shedding for auto-translation - each level adds a degradation step as the pipeline backs up:
+# 1 largest language groups only, 2 cheapest provider, 3 recently active readers only, 4 skip
+AUTO_PIPELINE_MAX = 200  # Messages being detected/translated at once; beyond this they are skipped
+SHED_DEPTH_LEVELS = (0.25, 0.5, 0.75, 1.0)  # Pipeline fill at which levels 1-4 start
+SHED_LAG_LEVELS = (0.1, 0.25, 0.5, 1.0)  # Event-loop lag (seconds) at which levels 1-4 start
+SHED_KEEP_LANGUAGES = 3
+ACTIVE_USER_SECONDS = 600  # "Active" readers posted in the channel this recently
+ACTIVE_USERS_PER_CHANNEL = 500
+LOOP_LAG_INTERVAL = 0.5  # How often event-loop lag is sampled
+
+# Micro-batching: texts for the same language pair are sent to the provider together
+BATCH_WINDOW_SECONDS = 0.05  # How long the first text waits for company
+BATCH_MAX_SIZE = 25  # Flush early at this many texts...
+BATCH_MAX_CHARS = 20000  # ...or this many characters
+
+# Provider chain - per-provider timeouts, circuit breakers and latency-aware routing
+DEEPL_TIMEOUT = 5
+GOOGLE_TIMEOUT = 5
+
+# Provider rate limits (token buckets, requests per second and burst size)
+DEEPL_RATE_PER_SECOND = 10
+DEEPL_RATE_BURST = 20
+GOOGLE_RATE_PER_SECOND = 5  # Unofficial endpoint; throttles aggressively past a few calls a second
+GOOGLE_RATE_BURST = 10
+RATE_LIMIT_MAX_WAIT = 0.5  # Seconds a call may wait for a token before spilling to the next provider
+
+# Per-guild fair share of auto-translation capacity, split between guilds active in the window
+GUILD_SHARE_WINDOW = 60  # Seconds
+GUILD_SHARE_CHARS = 60000  # Characters per window across all guilds
+GUILD_SHARE_REQUESTS = 600  # Translations (message x language) per window across all guilds
+GUILD_WEIGHTS = {}  # guild_id -> weight; unlisted guilds weigh 1.0
+GUILD_DEGRADE_AT = 1.0  # Load (usage / fair share) above which messages use the cheapest provider and fewer languages
+GUILD_DEFER_AT = 1.5  # ... above which messages wait for the window to drain first
+GUILD_SKIP_AT = 2.5  # ... above which messages are not translated
+GUILD_DEFER_MAX_SECONDS = 10
+GUILD_DEGRADED_LANGUAGES = 2  # Largest language groups kept for a degraded message
+
+# DeepL character quota - seeded from the usage API, charged per call, resynced periodically
+DEEPL_CHAR_RESERVE = 0.05  # Share of the quota held back; below it traffic moves to Google
+DEEPL_USAGE_REFRESH_MINUTES = 60
+BREAKER_FAILURES = 5  # Consecutive errors that open a provider's circuit
+BREAKER_SLOW_CALLS = 5  # ...or consecutive calls slower than BREAKER_SLOW_SECONDS
+BREAKER_SLOW_SECONDS = 3
+BREAKER_COOLDOWN = 30  # Seconds before a single trial call is let through again
+PROVIDER_STATS_WINDOW = 200  # Recent calls kept per provider / language pair
+PROVIDER_MIN_SAMPLES = 10  # Below this, routing uses wider stats or the expected latency
+PROVIDER_ERROR_PENALTY = 4  # Cost multiplier per unit of error rate
+PROVIDER_PROBE_RATE = 0.05  # Share of requests routed in configured order to re-measure demoted providers
+
+# Hedged requests - if the first provider is slower than its usual HEDGE_PERCENTILE latency, ask the next one too
+HEDGE_ENABLED = True
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_DELAY = 0.25  # Seconds; never hedge sooner than this
+
 # Language mapping with flags - ADDED role_name FIELD
 LANGUAGES = {
     'en': {'name': 'English', 'flag': '🇺🇸', 'role_name': 'English'},
@@ -93,7 +238,7 @@ class LanguageSelectView(ui.View):
         lang_info = LANGUAGES.get(lang_code)
         
         # Save user preference
-        self.translator.set_user_language(self.user_id, lang_code)
+        await service.db(self.translator.set_user_language, self.user_id, lang_code)
         
         embed = discord.Embed(
             title="✅ Language Set",
@@ -111,16 +256,1479 @@ class LanguageSelectView(ui.View):
 
 
 
+# ========== CACHING ==========
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and an entry/byte budget."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _sizeof(key, value):
+        return sys.getsizeof(key) + sys.getsizeof(value)
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[1] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        size = self._sizeof(key, value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            # Evict least recently used entries until we are back within budget
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop one entry; returns True if it was cached"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                return True
+            return False
+
+    def purge_expired(self):
+        """Drop every expired entry now instead of waiting for it to be read"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._data.items() if entry[1] <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': f"{len(self._data)}/{self.max_entries}",
+            'memory': f"{self._bytes / 1024:.0f}/{self.max_bytes / 1024:.0f} KiB",
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': f"{self.hits / lookups:.1%}" if lookups else "n/a",
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class UserLanguageIndex:
+    """In-memory user_id -> language_code map mirroring user_preferences.
+
+    When the whole table fits it is bulk-loaded and `complete`, so a miss means
+    "no preference". Otherwise it is a bounded LRU of the working set and
+    misses have to be looked up in the database.
+    """
+
+    UNKNOWN = object()
+
+    def __init__(self, max_entries=USER_INDEX_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.complete = False
+        self._languages = TTLCache(max_entries=max_entries, max_bytes=max_entries * 256)
+
+    def load(self, rows):
+        """Replace the index with a full snapshot of user_preferences"""
+        self._languages = dict(rows)
+        self.complete = True
+
+    def get(self, user_id):
+        """Language code, None for "no preference", or UNKNOWN if the database must be asked"""
+        if self.complete:
+            return self._languages.get(user_id)
+        return self._languages.get(user_id, self.UNKNOWN)
+
+    def set(self, user_id, language_code):
+        if self.complete:
+            self._languages[user_id] = language_code
+        else:
+            self._languages.set(user_id, language_code)
+
+    def __len__(self):
+        return len(self._languages)
+
+    def stats(self):
+        stats = {'mode': 'complete' if self.complete else 'partial', 'users': len(self)}
+        if not self.complete:
+            stats.update(self._languages.stats())
+        return stats
+
+
+class RoleLanguageIndex:
+    """Per-guild map of language role IDs to language codes.
+
+    Built from LANGUAGES[*]['role_name'] the first time a guild is seen and
+    rebuilt whenever one of its roles is created, renamed or deleted.
+    """
+
+    def __init__(self):
+        self._guilds = {}  # guild_id -> {role_id: lang_code}
+        self._codes_by_name = {info['role_name']: code for code, info in LANGUAGES.items()}
+
+    def build(self, guild):
+        mapping = {role.id: self._codes_by_name[role.name] for role in guild.roles if role.name in self._codes_by_name}
+        self._guilds[guild.id] = mapping
+        return mapping
+
+    def forget(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+    def for_guild(self, guild):
+        mapping = self._guilds.get(guild.id)
+        if mapping is None:
+            mapping = self.build(guild)
+        return mapping
+
+    def language_role(self, member):
+        """(role, lang_code) for the member's language role, or (None, None)"""
+        mapping = self.for_guild(member.guild)
+        if not mapping:
+            return None, None
+        matches = mapping.keys() & {role.id for role in member.roles}
+        if not matches:
+            return None, None
+        # Same tie-break as before: lowest role in the member's (position-sorted) role list
+        role = next(role for role in member.roles if role.id in matches)
+        return role, mapping[role.id]
+
+    def resolve(self, member):
+        return self.language_role(member)[1]
+
+    def language_of(self, role):
+        return self.for_guild(role.guild).get(role.id)
+
+
+class LanguageAudience:
+    """Per-channel histogram of language code -> ids of the non-bot members who can read it.
+
+    A channel is built from channel.members the first time it is translated and
+    then kept current from member, role, preference and permission events, so
+    grouping a message costs O(languages) instead of O(members).
+    """
+
+    def __init__(self, translator):
+        self.translator = translator
+        self._lock = threading.RLock()
+        self._channels = {}  # channel_id -> channel
+        self._histograms = {}  # channel_id -> {lang_code: {member_id, ...}}
+        self._member_guilds = {}  # member_id -> {guild_id, ...} with a built channel
+        self._active = {}  # channel_id -> OrderedDict of member_id -> last message time
+        self._stats = {'builds': 0, 'member_updates': 0, 'invalidations': 0}
+
+    def _guild_channels(self, guild_id):
+        """Snapshot of a guild's built channels; safe while build() runs on another thread"""
+        with self._lock:
+            return [channel for channel in self._channels.values() if channel.guild.id == guild_id]
+
+    def _file(self, channel_id, member_id, lang_code):
+        """Move a member to `lang_code` in one histogram (None removes them). Caller holds the lock."""
+        histogram = self._histograms[channel_id]
+        for code in list(histogram):
+            histogram[code].discard(member_id)
+            if not histogram[code]:
+                del histogram[code]
+        if lang_code:
+            histogram.setdefault(lang_code, set()).add(member_id)
+
+    def build(self, channel):
+        """Full rebuild of one channel (blocking - may query user_preferences)"""
+        members = [member for member in channel.members if not member.bot]
+        languages = self.translator.get_user_languages(members, channel.guild)
+
+        histogram = {}
+        for member_id, lang_code in languages.items():
+            histogram.setdefault(lang_code, set()).add(member_id)
+
+        with self._lock:
+            self._channels[channel.id] = channel
+            self._histograms[channel.id] = histogram
+            for member_id in languages:
+                self._member_guilds.setdefault(member_id, set()).add(channel.guild.id)
+            self._stats['builds'] += 1
+        return histogram
+
+    def language_groups(self, channel, source_lang, author_id, only=None):
+        """{lang_code: member_count} needing a translation, or None if the channel is not built yet.
+
+        Same rules as should_translate_for_user: skip the source language and the author.
+        `only` restricts the count to a set of member ids.
+        """
+        with self._lock:
+            histogram = self._histograms.get(channel.id)
+            if histogram is None:
+                return None
+            groups = {}
+            for lang_code, member_ids in histogram.items():
+                if lang_code == source_lang:
+                    continue
+                if only is not None:
+                    member_ids = member_ids & only
+                count = len(member_ids) - (author_id in member_ids)
+                if count:
+                    groups[lang_code] = count
+            return groups
+
+    def touch(self, channel_id, member_id):
+        """Note that a member just posted in a channel"""
+        with self._lock:
+            active = self._active.setdefault(channel_id, OrderedDict())
+            active[member_id] = time.monotonic()
+            active.move_to_end(member_id)
+            if len(active) > ACTIVE_USERS_PER_CHANNEL:
+                active.popitem(last=False)
+
+    def active_members(self, channel_id, within=ACTIVE_USER_SECONDS):
+        """Ids of members who posted in the channel within the last `within` seconds"""
+        cutoff = time.monotonic() - within
+        with self._lock:
+            active = self._active.get(channel_id, {})
+            return {member_id for member_id, seen in active.items() if seen >= cutoff}
+
+    def update_member(self, member):
+        """Re-file a member after a join, role change or preference change (blocking)"""
+        if member.bot:
+            return
+        channels = self._guild_channels(member.guild.id)
+        if not channels:
+            return
+        lang_code = self.translator.get_user_language(member.id, member.guild)
+
+        with self._lock:
+            for channel in channels:
+                if channel.id not in self._histograms:
+                    continue
+                can_read = channel.permissions_for(member).read_messages
+                self._file(channel.id, member.id, lang_code if can_read else None)
+            self._member_guilds.setdefault(member.id, set()).add(member.guild.id)
+            self._stats['member_updates'] += 1
+
+    def remove_member(self, guild_id, member_id):
+        with self._lock:
+            for channel in self._guild_channels(guild_id):
+                self._file(channel.id, member_id, None)
+            guilds = self._member_guilds.get(member_id)
+            if guilds is not None:
+                guilds.discard(guild_id)
+                if not guilds:
+                    del self._member_guilds[member_id]
+
+    def user_language_changed(self, user_id):
+        """Re-file a user everywhere they are tracked after their stored preference changed"""
+        with self._lock:
+            guild_ids = list(self._member_guilds.get(user_id, ()))
+        for guild_id in guild_ids:
+            channels = self._guild_channels(guild_id)
+            member = channels[0].guild.get_member(user_id) if channels else None
+            if member is not None:
+                self.update_member(member)
+
+    def invalidate(self, channel_id):
+        """Forget a channel (permission overwrites changed, channel deleted); rebuilt on next message"""
+        with self._lock:
+            self._active.pop(channel_id, None)
+            if self._channels.pop(channel_id, None) is not None:
+                self._histograms.pop(channel_id, None)
+                self._stats['invalidations'] += 1
+
+    def invalidate_guild(self, guild_id):
+        with self._lock:
+            for channel in self._guild_channels(guild_id):
+                self.invalidate(channel.id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['channels'] = len(self._histograms)
+            stats['members'] = len(self._member_guilds)
+        return stats
+
+
+# ========== DATABASE ==========
+class PostgresPool:
+    """Persistent, thread-safe pool of PostgreSQL connections shared by the whole bot."""
+
+    dialect = 'postgres'
+    RECONNECT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+    def __init__(self, database_url, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX):
+        result = urlparse(database_url)
+        self._dsn = {
+            'database': result.path[1:],  # Remove leading slash
+            'user': result.username,
+            'password': result.password,
+            'host': result.hostname,
+            'port': result.port,
+            'sslmode': 'require',  # Railway requires SSL
+            'connect_timeout': DB_POOL_TIMEOUT,
+            'keepalives': 1,
+            'keepalives_idle': 60,
+        }
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._pool = None
+        self._lock = threading.Lock()
+        # psycopg2 raises instead of waiting when the pool is empty, so gate checkouts ourselves
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._stats = {
+            'checkouts': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'waits': 0,
+            'health_checks': 0,
+            'discarded': 0,
+            'reconnects': 0,
+            'errors': 0,
+        }
+        self._open()
+
+    @staticmethod
+    def translate(query):
+        return query
+
+    def _open(self):
+        """(Re)create the underlying pool, opening `minconn` connections up front."""
+        with self._lock:
+            if self._pool is not None and not self._pool.closed:
+                return
+            self._pool = pg_pool.ThreadedConnectionPool(self.minconn, self.maxconn, **self._dsn)
+            self._last_used.clear()
+        logger.info(f"📊 PostgreSQL pool ready ({self.minconn}-{self.maxconn} connections)")
+
+    def _is_healthy(self, conn):
+        """Cheap liveness check; only pings connections that have been idle for a while."""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < DB_HEALTH_CHECK_IDLE:
+            return True  # Freshly opened or recently used
+        self._stats['health_checks'] += 1
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except self.RECONNECT_ERRORS:
+            return False
+
+    def _discard(self, conn):
+        self._stats['discarded'] += 1
+        self._last_used.pop(id(conn), None)
+        try:
+            self._pool.putconn(conn, close=True)
+        except Exception:
+            pass
+
+    def _checkout(self):
+        if self._pool is None or self._pool.closed:
+            self._stats['reconnects'] += 1
+            self._open()
+        # A dead connection is replaced at most `maxconn` times before giving up
+        for _ in range(self.maxconn + 1):
+            conn = self._pool.getconn()
+            if self._is_healthy(conn):
+                return conn
+            logger.warning("🔄 Dropping dead PostgreSQL connection")
+            self._discard(conn)
+            self._stats['reconnects'] += 1
+        raise psycopg2.OperationalError("Could not obtain a healthy PostgreSQL connection")
+
+    @contextmanager
+    def connection(self, timeout=DB_POOL_TIMEOUT):
+        """Borrow a connection; it is returned (or discarded if broken) on exit."""
+        if not self._slots.acquire(blocking=False):
+            self._stats['waits'] += 1
+            if not self._slots.acquire(timeout=timeout):
+                raise pg_pool.PoolError(f"No free PostgreSQL connection after {timeout}s")
+
+        conn = None
+        try:
+            conn = self._checkout()
+            with self._lock:
+                self._stats['checkouts'] += 1
+                self._stats['in_use'] += 1
+                self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+            try:
+                yield conn
+            except Exception as e:
+                self._stats['errors'] += 1
+                if isinstance(e, self.RECONNECT_ERRORS):
+                    self._discard(conn)
+                    conn = None
+                raise
+            finally:
+                with self._lock:
+                    self._stats['in_use'] -= 1
+                # Always give the connection back, whatever the caller raised
+                if conn is not None:
+                    self._release(conn)
+        finally:
+            self._slots.release()
+
+    def _release(self, conn):
+        """Return a borrowed connection to the pool rolled back, or discard it if broken."""
+        if conn.closed:
+            self._discard(conn)
+            return
+        try:
+            # Never hand out a connection that is still inside a transaction
+            if conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        self._last_used[id(conn)] = time.monotonic()
+        self._pool.putconn(conn)
+
+    async def run(self, func, *args):
+        """Run `func(conn, *args)` with a pooled connection on a worker thread."""
+        def call():
+            with self.connection() as conn:
+                return func(conn, *args)
+        return await asyncio.to_thread(call)
+
+    def stats(self):
+        """Pool usage counters for monitoring."""
+        stats = dict(self._stats)
+        stats['size'] = f"{self.minconn}-{self.maxconn}"
+        stats['idle'] = len(self._pool._pool) if self._pool and not self._pool.closed else 0
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+        logger.info("📊 PostgreSQL pool closed")
+
+
+@lru_cache(maxsize=256)
+def to_sqlite_sql(query):
+    """Rewrite the PostgreSQL flavoured queries used throughout the bot for SQLite"""
+    query = query.replace('%s', '?')
+    # CURRENT_TIMESTAMP - INTERVAL '1 day'  ->  datetime('now', '-1 day')
+    return re.sub(
+        r"CURRENT_TIMESTAMP\s*([+-])\s*INTERVAL\s*'(\d+)\s*(\w+)'",
+        lambda m: f"datetime('now', '{m.group(1)}{m.group(2)} {m.group(3)}')",
+        query,
+        flags=re.IGNORECASE,
+    )
+
+
+class SQLiteStore:
+    """Single long-lived SQLite connection in WAL mode, shared across threads."""
+
+    dialect = 'sqlite'
+    RECONNECT_ERRORS = ()
+
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',  # Safe with WAL, avoids an fsync per commit
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA cache_size=-16000',  # ~16 MB page cache
+        'PRAGMA mmap_size=67108864',
+        'PRAGMA busy_timeout=5000',
+        'PRAGMA foreign_keys=ON',
+    )
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._stats = {'queries': 0, 'waits': 0, 'checkpoints': 0, 'vacuums': 0, 'errors': 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Incremental vacuum has to be enabled before it can be used; converting an old file needs one VACUUM
+        if self._conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self._conn.execute('VACUUM')
+        for pragma in self.PRAGMAS:
+            self._conn.execute(pragma)
+        logger.info(f"📁 SQLite store ready ({path}, WAL)")
+
+    @staticmethod
+    def translate(query):
+        return to_sqlite_sql(query)
+
+    @contextmanager
+    def connection(self, timeout=DB_POOL_TIMEOUT):
+        """Borrow the shared connection; access is serialized by a lock."""
+        if not self._lock.acquire(blocking=False):
+            self._stats['waits'] += 1
+            if not self._lock.acquire(timeout=timeout):
+                raise sqlite3.OperationalError(f"SQLite connection busy for {timeout}s")
+        try:
+            self._stats['queries'] += 1
+            yield self._conn
+        except Exception:
+            self._stats['errors'] += 1
+            self._conn.rollback()
+            raise
+        finally:
+            self._lock.release()
+
+    async def run(self, func, *args):
+        """Run `func(conn, *args)` with the shared connection on a worker thread."""
+        def call():
+            with self.connection() as conn:
+                return func(conn, *args)
+        return await asyncio.to_thread(call)
+
+    def maintenance(self):
+        """Checkpoint the WAL and hand free pages back to the filesystem"""
+        with self.connection() as conn:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._stats['checkpoints'] += 1
+            conn.execute('PRAGMA incremental_vacuum')
+            self._stats['vacuums'] += 1
+            conn.execute('PRAGMA optimize')
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['path'] = self.path
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._conn.close()
+        logger.info("📁 SQLite store closed")
+
+
+# ========== LANGUAGE DETECTION ==========
+# Common words per Latin-script language; they seed both the stop-word sets and
+# the character-trigram profiles used by LocalLanguageDetector.
+LATIN_LANGUAGE_SAMPLES = {
+    'en': "the be to of and a in that have it for not on with he as you do at this but his by from they we say her "
+          "she or an will my one all would there their what so up out if about who get which go me when make can "
+          "like time no just him know take people into year your good some could them see other than then now look "
+          "only come its over think also back after use two how our work first well way even new want because any "
+          "these give day most us is are was were been has had did does i'm it's don't can't yes thanks thank hello "
+          "please today really love going where why everyone gm gn lol lmao brb idk ok okay yeah guys"
+          " anyone tonight",
+    'es': "de la que el en y a los se del las un por con no una su para es al lo como más pero sus le ya o este sí "
+          "porque esta entre cuando muy sin sobre también me hasta hay donde quien desde todo nos durante todos uno "
+          "les ni contra otros ese eso ante ellos esto mí antes algunos qué unos yo otro otras otra él tanto esa "
+          "estos mucho quienes nada muchos cual poco ella estar estas algo nosotros hola gracias buenos días cómo "
+          "estás bien tengo quiero hacer puedo vamos está son fue hoy ahora señor niño año",
+    'fr': "le de un être et à il avoir ne je son que se qui ce dans en du elle au pour pas vous par sur faire plus "
+          "dire me on mon lui nous comme mais pouvoir avec tout y aller voir bien où sans tu ou leur si deux moi "
+          "vouloir te venir quand grand celui notre devoir là jour prendre même votre rien petit encore aussi "
+          "quelque dont trouver donner temps ça peu falloir sous parler alors sa les des est une c'est suis "
+          "bonjour merci très aujourd'hui pourquoi salut oui beaucoup cette était êtes français",
+    'de': "der die und in den von zu das mit sich des auf für ist im dem nicht ein eine als auch es an werden aus er "
+          "hat dass sie nach wird bei einer um am sind noch wie einem über einen so zum war haben nur oder aber vor "
+          "zur bis mehr durch man sein wurde sei hallo danke ich bin du bist wir ihr heute gut sehr was wer warum "
+          "können möchte schön ähnlich straße mich dich jetzt hier schon wirklich geht gibt guten morgen "
+          "zusammen jemand keine weiß",
+    'it': "di che e la il un a è per in una mi sono ho non ma lo ha le si ti con cosa se io come da ci no questo qui "
+          "hai sei del bene tu sì me più al mio c'è perché lei solo te era gli tutto della ciao grazie buongiorno "
+          "anche molto oggi sempre allora niente vuoi fare posso dove chi quando siamo stato questa quello nella "
+          "sono ragazzi tutti",
+    'pt': "de a o que e do da em um para é com não uma os no se na por mais as dos como mas foi ao ele das tem à "
+          "seu sua ou ser quando muito há nos já está eu também só pelo pela até isso ela entre era depois sem "
+          "mesmo aos ter seus quem nas me esse eles estão você tinha foram essa num nem suas meu às minha têm numa "
+          "pelos elas olá obrigado obrigada bom dia tudo bem então agora vamos não ação informação alguém "
+          "começa coisa gente",
+    'vi': "và của có là không được cho người những một các với trong này đã để khi đến thì từ như bạn tôi chúng ta "
+          "anh em rất cũng nhưng làm gì nào sẽ đi về ra lại vì đó theo nhiều hơn mình xin chào cảm ơn hôm nay thế "
+          "nào vậy rồi biết muốn mọi người ở đây nữa",
+    'id': "yang dan di itu dengan untuk tidak ini dari dalam akan pada juga saya ke karena ada mereka bisa atau kita "
+          "sudah apa kamu aku lebih seperti hanya oleh harus ya belum saat banyak bagaimana sangat kami dia terima "
+          "kasih selamat pagi baik sekali mau sama lagi nanti sekarang tapi semua orang sini",
+    'tr': "bir ve bu da de için ile çok ne daha gibi ama var o ben sen biz siz onlar değil mi mı mu mü olarak kadar "
+          "sonra şey her en ki ya merhaba teşekkürler teşekkür ederim nasılsın iyi günaydın evet hayır şimdi bugün "
+          "güzel yok neden nerede burada çünkü oldu olan ediyor istiyorum herkese arkadaşlar",
+    'pl': "i w nie na się z to że do jest co jak ale o tak po za od już tylko jego czy jej może mnie być dla był "
+          "przez ich są mi ten ta bardzo jeszcze też gdzie kiedy dlaczego cześć dzień dobry dziękuję proszę "
+          "wszystko teraz dzisiaj mam chcę możesz wiem będzie który która jestem jesteś wszystkim",
+    'nl': "de het een en van ik te dat die in is je niet zijn op aan met voor hij er maar om hem dan zou of wat mijn "
+          "men dit zo door over ze zich bij ook tot mij uit daar haar naar heb hoe heeft hebben deze u want nog zal "
+          "me zij nu geen omdat iets worden toch al waren veel meer doen hallo dank wel goedemorgen alsjeblieft "
+          "vandaag iedereen jullie",
+    'sv': "och i att det som en på är av för med till den har de inte om ett han men var jag sig från vi så kan man "
+          "när år säga hon under också efter eller nu sin där vid mycket hej tack god morgon hur mår du bra idag vad "
+          "varför kanske ska vill skulle något alla här jättebra",
+    'da': "og i at det en til er som på de med han af for ikke der var mig sig men et har om vi min havde ham hun nu "
+          "over da fra du ud sin dem os op man hans hvor eller hvad skal selv her alle vil blev kunne ind når være "
+          "dog noget ville jo deres efter ned skulle denne end dette mit også hej tak godmorgen hvordan godt "
+          "hvorfor måske rigtig meget ved nogen hvornår gøre gerne lige altså",
+    'no': "og i det er som på en til av at de med for har ikke den han var jeg seg om et men så vi kan du fra hun "
+          "eller når også etter ble hva skal vil noe nå der her meg deg hei takk god morgen hvordan bra i dag "
+          "hvorfor kanskje mye ikkje veldig alle sammen vet noen gjøre hvem",
+    'fi': "ja on ei se että hän oli en ole mutta minä sinä me te he tämä kun niin kuin mitä myös vain jos nyt vielä "
+          "sitten jo kanssa olen olet ovat ollut mikä miksi missä hyvää huomenta kiitos moi hei tänään paljon "
+          "kaikki tai koska joka minun sinun meidän tässä siitä kaikille",
+}
+
+# Unicode ranges of scripts that (within LANGUAGES) point to a single language
+SCRIPT_RANGES = (
+    ('ko', ((0xAC00, 0xD7AF), (0x1100, 0x11FF), (0x3130, 0x318F))),
+    ('ja', ((0x3040, 0x30FF),)),  # Hiragana / Katakana
+    ('zh', ((0x4E00, 0x9FFF), (0x3400, 0x4DBF))),  # Han (Japanese if any kana is present)
+    ('ar', ((0x0600, 0x06FF), (0x0750, 0x077F))),
+    ('hi', ((0x0900, 0x097F),)),
+    ('th', ((0x0E00, 0x0E7F),)),
+    ('ru', ((0x0400, 0x04FF),)),
+)
+
+
+class LocalLanguageDetector:
+    """Offline language detector limited to the codes in LANGUAGES.
+
+    Non-Latin scripts are classified by Unicode range; Latin-script text is
+    scored against character-trigram profiles plus common-word hits. Returns
+    a (lang_code, confidence) pair so callers can fall back to the remote
+    detector when the guess is weak. Letters it has no profile for (Greek,
+    Hebrew, ...) give ('auto', 0.0) rather than a guess.
+    """
+
+    WORD_WEIGHT = 0.6
+
+    def __init__(self, samples=LATIN_LANGUAGE_SAMPLES):
+        self.languages = [code for code in samples if code in LANGUAGES]
+        self._words = {}
+        self._trigrams = {}  # trigram -> [(language index, weight), ...]
+        for index, code in enumerate(self.languages):
+            words = samples[code].split()
+            self._words[code] = set(words)
+            counts = {}
+            for word in words:
+                for trigram in self._word_trigrams(word):
+                    counts[trigram] = counts.get(trigram, 0) + 1
+            norm = sum(c * c for c in counts.values()) ** 0.5
+            for trigram, count in counts.items():
+                self._trigrams.setdefault(trigram, []).append((index, count / norm))
+        self._script_of = {}
+        for code, ranges in SCRIPT_RANGES:
+            for start, end in ranges:
+                self._script_of[(start, end)] = code
+
+    @staticmethod
+    def _word_trigrams(word):
+        padded = f" {word} "
+        return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    def _script(self, char):
+        point = ord(char)
+        if point < 0x0250 or 0x1E00 <= point <= 0x1EFF:  # Latin-1, Extended-A/B and Extended Additional
+            return 'latin'
+        for (start, end), code in self._script_of.items():
+            if start <= point <= end:
+                return code
+        return 'other'
+
+    def script_of(self, text):
+        """Dominant script as ('latin', 'other' or a language code, share of letters); (None, 0.0) without letters"""
+        letters = [char for char in text.lower() if char.isalpha()]
+        if not letters:
+            return None, 0.0
+        scripts = {}
+        for char in letters:
+            script = self._script(char)
+            scripts[script] = scripts.get(script, 0) + 1
+
+        script, count = max(scripts.items(), key=lambda item: item[1])
+        if script == 'zh' and scripts.get('ja'):
+            script, count = 'ja', count + scripts['ja']
+        return script, count / len(letters)
+
+    def top_guesses(self, text, k=PRIOR_TOP_GUESSES):
+        """Up to `k` plausible lang codes for `text`, best first; empty for unknown scripts"""
+        script, _ = self.script_of(text)
+        if script is None or script == 'other':
+            return []
+        if script != 'latin':
+            return [script]
+        scored = self._score_latin(text.lower())
+        if scored is None:
+            return []
+        scores, _ = scored
+        ranked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+        return [self.languages[index] for index in ranked[:k] if scores[index] > 0]
+
+    def detect(self, text):
+        """(lang_code, confidence 0-1); (None, 0.0) when the text has no letters"""
+        script, share = self.script_of(text)
+        if script is None:
+            return None, 0.0
+        if script == 'other':
+            return 'auto', 0.0  # A script we have no profile for - only the remote detector can tell
+        if script != 'latin':
+            return script, share
+
+        return self._detect_latin(text.lower(), share)
+
+    def _score_latin(self, text):
+        """(per-language scores, trigram count), or None when `text` has no words"""
+        words = [''.join(char for char in token if char.isalpha() or char == "'") for token in text.split()]
+        words = [word for word in words if word]
+        if not words:
+            return None
+
+        scores = [0.0] * len(self.languages)
+        total = 0
+        for word in words:
+            for trigram in self._word_trigrams(word.replace("'", '')):
+                total += 1
+                for index, weight in self._trigrams.get(trigram, ()):
+                    scores[index] += weight
+        if total:
+            scores = [score / total ** 0.5 for score in scores]
+        for index, code in enumerate(self.languages):
+            hits = sum(1 for word in words if word in self._words[code])
+            scores[index] += self.WORD_WEIGHT * hits / len(words)
+        return scores, total
+
+    def _detect_latin(self, text, script_share):
+        scored = self._score_latin(text)
+        if scored is None:
+            return 'auto', 0.0
+        scores, total = scored
+
+        ranked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+        best, second = scores[ranked[0]], scores[ranked[1]]
+        if best <= 0:
+            return 'auto', 0.0  # Latin letters, but nothing any profile recognises
+        confidence = (best - second) / best
+        # Very short texts carry little evidence
+        confidence *= min(1.0, total / 12) * script_share
+        return self.languages[ranked[0]], round(confidence, 3)
+
+
+class LanguagePriors:
+    """Recent detected languages per author and per channel.
+
+    When an author (or failing that, the channel) has written one language
+    almost exclusively and it is among the offline detector's top guesses
+    for the message, that language stands in for the remote (Google)
+    detector when the offline guess is not confident. It never overrides a confident offline detection, so a
+    minority-language message in a majority-language channel is still caught.
+    A sample of prior-eligible messages is audited against Google so the hit
+    rate can be watched and PRIOR_MIN_SHARE tuned.
+    """
+
+    def __init__(self, detector):
+        self.detector = detector
+        # author_id / channel_id -> deque of lang codes, LRU-bounded so departed users age out
+        self._authors = TTLCache(max_entries=PRIOR_MAX_AUTHORS, ttl=PRIOR_TTL_SECONDS)
+        self._channels = TTLCache(max_entries=PRIOR_MAX_CHANNELS, ttl=PRIOR_TTL_SECONDS)
+        self._stats = {
+            'remote_skipped': 0,
+            'audited': 0,
+            'audit_correct': 0,
+            'detector_disagreed': 0,
+            'detected_predictions': 0,
+            'detected_correct': 0,
+        }
+
+    @staticmethod
+    def _strongest(history):
+        if not history or len(history) < PRIOR_MIN_SAMPLES:
+            return None, 0.0
+        lang_code, count = Counter(history).most_common(1)[0]
+        return lang_code, count / len(history)
+
+    def predict(self, author_id, channel_id):
+        """(lang_code, share) from the author's history, else the channel's"""
+        lang_code, share = self._strongest(self._authors.get(author_id))
+        if lang_code is None:
+            lang_code, share = self._strongest(self._channels.get(channel_id))
+        return lang_code, share
+
+    def guess(self, author_id, channel_id, text):
+        """Language that may replace a remote detection of `text`, or None"""
+        lang_code, share = self.predict(author_id, channel_id)
+        if lang_code is None or share < PRIOR_MIN_SHARE:
+            return None
+        if lang_code not in self.detector.top_guesses(text):
+            self._stats['detector_disagreed'] += 1
+            return None
+        return lang_code
+
+    def used(self):
+        """A prior answered in place of the remote detector"""
+        self._stats['remote_skipped'] += 1
+
+    def should_audit(self):
+        return random.random() < PRIOR_AUDIT_RATE
+
+    def record(self, author_id, channel_id, lang_code, predicted=None, audited=False):
+        """Feed a real detection back; `predicted` is what the prior expected, if anything"""
+        if predicted is not None:
+            correct = predicted == lang_code
+            if audited:
+                self._stats['audited'] += 1
+                self._stats['audit_correct'] += correct
+            else:
+                self._stats['detected_predictions'] += 1
+                self._stats['detected_correct'] += correct
+            if audited and not correct:
+                # The author switched languages - stop trusting their old history
+                self._authors.invalidate(author_id)
+
+        self._append(self._authors, author_id, lang_code, PRIOR_AUTHOR_WINDOW)
+        self._append(self._channels, channel_id, lang_code, PRIOR_CHANNEL_WINDOW)
+
+    @staticmethod
+    def _append(histories, key, lang_code, window):
+        history = histories.get(key) or deque(maxlen=window)
+        history.append(lang_code)
+        histories.set(key, history)  # Re-set so the entry's TTL and LRU position follow activity
+
+    def stats(self):
+        stats = dict(self._stats)
+        if stats['audited']:
+            stats['audit_accuracy'] = f"{stats['audit_correct'] / stats['audited']:.1%}"
+        if stats['detected_predictions']:
+            stats['detected_accuracy'] = f"{stats['detected_correct'] / stats['detected_predictions']:.1%}"
+        stats['authors'] = len(self._authors)
+        stats['channels'] = len(self._channels)
+        return stats
+
+
+# ========== TRANSLATION PROVIDERS ==========
+class TranslationProvider:
+    """One translation backend in the ProviderChain.
+
+    Subclasses implement the blocking translate_batch(); further providers
+    plug in with ProviderChain.add().
+    """
+
+    name = 'provider'
+    timeout = TRANSLATION_TIMEOUT
+    expected_latency = 1.0  # Seconds, used for routing until real samples exist
+    weight = 1.0  # Quality preference; higher is tried first when latencies are similar
+    rate_per_second = None  # Token-bucket refill rate; None means unlimited
+    rate_burst = 1
+    quota = None  # CharacterQuota for providers billed per character
+    billed = False  # Skipped when a caller asks for the cheapest route
+
+    def supports(self, target_lang, source_lang):
+        return True
+
+    def translate_batch(self, texts, target_lang, source_lang):
+        """Translations aligned with `texts` (None where it failed); raises on provider errors"""
+        raise NotImplementedError
+
+
+class DeepLProvider(TranslationProvider):
+    name = 'deepl'
+    timeout = DEEPL_TIMEOUT
+    expected_latency = 0.6
+    weight = 1.5
+    rate_per_second = DEEPL_RATE_PER_SECOND
+    rate_burst = DEEPL_RATE_BURST
+    billed = True
+
+    def __init__(self, client, supported, to_deepl_code):
+        self.client = client
+        self.supported = supported
+        self.to_deepl_code = to_deepl_code
+        self.quota = CharacterQuota()
+
+    def refresh_usage(self):
+        """Resync the character quota with DeepL's usage API (blocking)"""
+        usage = self.client.get_usage()
+        if usage.character is not None and usage.character.valid:
+            self.quota.sync(usage.character.count, usage.character.limit)
+        logger.info(f"📊 DeepL usage: {self.quota.summary()}")
+
+    def supports(self, target_lang, source_lang):
+        return self.to_deepl_code(target_lang) in self.supported
+
+    def translate_batch(self, texts, target_lang, source_lang):
+        deepl_source = None if source_lang == 'auto' else self.to_deepl_code(source_lang)
+        if deepl_source and deepl_source not in self.supported:
+            deepl_source = None
+        results = self.client.translate_text(
+            texts,
+            target_lang=self.to_deepl_code(target_lang),
+            source_lang=deepl_source
+        )
+        return [result.text if result and result.text else None for result in results]
+
+
+class GoogleProvider(TranslationProvider):
+    name = 'google'
+    timeout = GOOGLE_TIMEOUT
+    expected_latency = 0.8
+    rate_per_second = GOOGLE_RATE_PER_SECOND
+    rate_burst = GOOGLE_RATE_BURST
+
+    def __init__(self, client):
+        self.client = client
+
+    def translate_batch(self, texts, target_lang, source_lang):
+        results = self.client.translate(texts, dest=target_lang, src=source_lang)
+        return [result.text if result and result.text else None for result in results]
+
+
+class CircuitBreaker:
+    """Stops routing to a provider after repeated errors or latency spikes.
+
+    closed -> open after BREAKER_FAILURES consecutive failures or
+    BREAKER_SLOW_CALLS consecutive calls slower than BREAKER_SLOW_SECONDS;
+    open -> half-open after BREAKER_COOLDOWN seconds, where a single trial
+    call decides between closed and open again.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, slow_calls=BREAKER_SLOW_CALLS,
+                 slow_seconds=BREAKER_SLOW_SECONDS, cooldown=BREAKER_COOLDOWN):
+        self.failure_threshold = failures
+        self.slow_threshold = slow_calls
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.failures = 0
+        self.slow = 0
+        self.trips = 0
+        self._trial_running = False
+
+    def available(self):
+        """Could a call go through right now (no side effects)?"""
+        if self.state == 'open':
+            return time.monotonic() - self.opened_at >= self.cooldown
+        if self.state == 'half-open':
+            return not self._trial_running
+        return True
+
+    def release(self):
+        """Give back a claimed call that was abandoned without an outcome"""
+        self._trial_running = False
+
+    def acquire(self):
+        """Claim permission for one call"""
+        if not self.available():
+            return False
+        if self.state == 'open':
+            self.state = 'half-open'
+        if self.state == 'half-open':
+            self._trial_running = True
+        return True
+
+    def record(self, ok, latency, slow=None):
+        """Outcome of one call; `slow` overrides the latency check (e.g. an abandoned hedge)"""
+        self._trial_running = False
+        if slow is None:
+            slow = latency >= self.slow_seconds
+        self.failures = 0 if ok else self.failures + 1
+        self.slow = self.slow + 1 if ok and slow else 0
+
+        if self.state == 'half-open':
+            if ok and not slow:
+                self.state = 'closed'
+            else:
+                self._open()
+        elif self.failures >= self.failure_threshold or self.slow >= self.slow_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self.failures = self.slow = 0
+        self.trips += 1
+
+
+class TokenBucket:
+    """Request rate limiter: `rate` tokens per second, up to `burst` banked."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=0.0):
+        """Take a token; returns seconds to wait before using it, or None if that exceeds max_wait"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+
+class CharacterQuota:
+    """Billed-character budget for one provider.
+
+    Seeded from the provider's usage API and charged locally after every
+    call; the last DEEPL_CHAR_RESERVE of the limit is never spent so
+    traffic moves elsewhere before the hard limit is hit.
+    """
+
+    def __init__(self, reserve=DEEPL_CHAR_RESERVE):
+        self.reserve = reserve
+        self.limit = None  # Unknown or unlimited
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def sync(self, used, limit):
+        with self._lock:
+            self.used, self.limit = used, limit
+
+    def remaining(self):
+        if self.limit is None:
+            return None
+        return max(0, int(self.limit * (1 - self.reserve)) - self.used)
+
+    def allows(self, chars=1):
+        remaining = self.remaining()
+        return remaining is None or chars <= remaining
+
+    def charge(self, chars):
+        with self._lock:
+            self.used += chars
+
+    def summary(self):
+        if self.limit is None:
+            return f"{self.used:,} chars, no limit"
+        return f"{self.used:,}/{self.limit:,} chars ({self.used / self.limit:.0%}), {self.remaining():,} spendable"
+
+
+class ProviderHealth:
+    """Rolling latency / error window for one provider (optionally one language pair)."""
+
+    def __init__(self, window=PROVIDER_STATS_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def record(self, ok, latency):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    @property
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def __len__(self):
+        return len(self.outcomes)
+
+
+class ProviderChain:
+    """Ordered set of providers with per-provider circuit breakers.
+
+    Each request is routed per language pair: providers whose breaker is
+    open are skipped and the rest are ranked by observed p50/p95 latency
+    and error rate (falling back to provider-wide numbers, then to the
+    provider's expected latency, while a pair has few samples).
+    """
+
+    def __init__(self, providers=()):
+        self.providers = []
+        self.breakers = {}
+        self._health = {}  # (provider name, source, target) and provider name -> ProviderHealth
+        self._calls = {}
+        self.limiters = {}
+        self._lock = threading.Lock()
+        self.hedge_stats = {'hedged': 0, 'backup_wins': 0, 'primary_wins': 0, 'both_failed': 0, 'extra_chars': 0}
+        for provider in providers:
+            self.add(provider)
+
+    def add(self, provider, first=False):
+        if first:
+            self.providers.insert(0, provider)
+        else:
+            self.providers.append(provider)
+        self.breakers[provider.name] = CircuitBreaker()
+        self._health[provider.name] = ProviderHealth()
+        self._calls[provider.name] = {'calls': 0, 'failures': 0, 'abandoned': 0, 'throttled': 0, 'over_quota': 0}
+        if provider.rate_per_second:
+            self.limiters[provider.name] = TokenBucket(provider.rate_per_second, provider.rate_burst)
+
+    def _pair_health(self, provider, target_lang, source_lang):
+        key = (provider.name, source_lang, target_lang)
+        if key not in self._health:
+            self._health[key] = ProviderHealth()
+        return self._health[key]
+
+    def _cost(self, provider, target_lang, source_lang):
+        """Expected cost of a call: tail latency inflated by error rate, divided by preference"""
+        health = self._pair_health(provider, target_lang, source_lang)
+        if len(health) < PROVIDER_MIN_SAMPLES:
+            health = self._health[provider.name]
+        if len(health) < PROVIDER_MIN_SAMPLES:
+            return provider.expected_latency / provider.weight
+        p50 = health.percentile(50)
+        latency = (p50 + health.percentile(95)) / 2 if p50 is not None else provider.timeout
+        return latency * (1 + PROVIDER_ERROR_PENALTY * health.error_rate) / provider.weight
+
+    def route(self, target_lang, source_lang, exclude=()):
+        """Providers to try for this pair, best first"""
+        with self._lock:
+            candidates = [
+                provider for provider in self.providers
+                if provider.name not in exclude
+                and provider.supports(target_lang, source_lang)
+                and self.breakers[provider.name].available()
+                and (provider.quota is None or provider.quota.allows())
+            ]
+            # Occasionally keep the configured order so demoted providers get fresh samples
+            if random.random() < PROVIDER_PROBE_RATE:
+                return candidates
+            return sorted(candidates, key=lambda provider: self._cost(provider, target_lang, source_lang))
+
+    def billed_for(self, target_lang, source_lang):
+        """Whether a billed provider serves this pair - i.e. whether the cheap route can give a different result"""
+        return any(provider.billed and provider.supports(target_lang, source_lang) for provider in self.providers)
+
+    def acquire(self, provider, texts=()):
+        """Admit one call: quota, then breaker, then rate limit.
+
+        Returns the seconds to wait before calling, or None if the call must
+        go elsewhere. The breaker is asked first so an open circuit doesn't
+        burn rate-limit tokens.
+        """
+        chars = sum(len(text) for text in texts)
+        if provider.quota is not None and not provider.quota.allows(chars):
+            with self._lock:
+                self._calls[provider.name]['over_quota'] += 1
+            return None
+        limiter = self.limiters.get(provider.name)
+        with self._lock:
+            breaker = self.breakers[provider.name]
+            if not breaker.available():
+                return None
+            wait = limiter.reserve(RATE_LIMIT_MAX_WAIT) if limiter else 0.0
+            if wait is None:
+                self._calls[provider.name]['throttled'] += 1
+                return None
+            breaker.acquire()
+            return wait
+
+    def record_abandoned(self, provider, target_lang, source_lang, elapsed):
+        """A call that lost a hedge race: a censored sample - it took at least `elapsed` - counted as slow.
+
+        Without this a provider that stalls on every call would never be
+        measured, demoted or tripped, and every request would keep paying the
+        hedge delay.
+        """
+        with self._lock:
+            self.breakers[provider.name].record(True, elapsed, slow=True)
+            self._health[provider.name].record(True, elapsed)
+            self._pair_health(provider, target_lang, source_lang).record(True, elapsed)
+            self._calls[provider.name]['calls'] += 1
+            self._calls[provider.name]['abandoned'] += 1
+            state = self.breakers[provider.name].state
+        if state == 'open':
+            logger.warning(f"⚡ Circuit open for {provider.name} (losing hedges), routing around it")
+
+    def charge(self, provider, texts):
+        """Account billed characters after a successful call"""
+        if provider.quota is not None:
+            provider.quota.charge(sum(len(text) for text in texts))
+
+    def record(self, provider, target_lang, source_lang, ok, latency):
+        with self._lock:
+            self.breakers[provider.name].record(ok, latency)
+            self._health[provider.name].record(ok, latency)
+            self._pair_health(provider, target_lang, source_lang).record(ok, latency)
+            self._calls[provider.name]['calls'] += 1
+            self._calls[provider.name]['failures'] += not ok
+            state = self.breakers[provider.name].state
+        if state == 'open' and not ok:
+            logger.warning(f"⚡ Circuit open for {provider.name}, routing around it")
+
+    async def call(self, provider, texts, target_lang, source_lang, run):
+        """One provider attempt on the worker pool, recorded for routing; None if it failed"""
+        wait = self.acquire(provider, texts)
+        if wait is None:
+            return None
+
+        start = time.monotonic()
+        results = None
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+                start = time.monotonic()  # Rate-limit waits aren't provider latency
+            results = await run(provider.translate_batch, texts, target_lang, source_lang, timeout=provider.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ {provider.name} timed out after {provider.timeout}s → {target_lang}")
+        except asyncio.CancelledError:
+            # Abandoned (e.g. lost a hedge) - no verdict on the provider's health
+            with self._lock:
+                self.breakers[provider.name].release()
+            raise
+        except Exception as e:
+            logger.warning(f"{provider.name} error → {target_lang}: {e}")
+
+        ok = bool(results) and any(results)
+        self.record(provider, target_lang, source_lang, ok, time.monotonic() - start)
+        if ok:
+            self.charge(provider, texts)
+        return results if ok else None
+
+    def hedge_delay(self, provider, target_lang, source_lang):
+        """How long to wait on `provider` before hedging: its usual HEDGE_PERCENTILE latency"""
+        with self._lock:
+            health = self._pair_health(provider, target_lang, source_lang)
+            if len(health) < PROVIDER_MIN_SAMPLES:
+                health = self._health[provider.name]
+            delay = health.percentile(HEDGE_PERCENTILE) if len(health) >= PROVIDER_MIN_SAMPLES else None
+        if delay is None:
+            delay = provider.expected_latency * 2
+        return min(max(delay, HEDGE_MIN_DELAY), provider.timeout)
+
+    async def hedged_call(self, primary, backup, texts, target_lang, source_lang, run):
+        """Call `primary`; if it is slow, race `backup` against it.
+
+        Returns (results, winner name, whether the backup was called).
+        """
+        started = {primary: time.monotonic()}
+        primary_task = asyncio.ensure_future(self.call(primary, texts, target_lang, source_lang, run))
+        done, _ = await asyncio.wait({primary_task}, timeout=self.hedge_delay(primary, target_lang, source_lang))
+        if done:
+            return primary_task.result(), primary.name, False
+
+        self.hedge_stats['hedged'] += 1
+        self.hedge_stats['extra_chars'] += sum(len(text) for text in texts)
+        started[backup] = time.monotonic()
+        backup_task = asyncio.ensure_future(self.call(backup, texts, target_lang, source_lang, run))
+        owners = {primary_task: primary, backup_task: backup}
+        pending = set(owners)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results = task.result()
+                    if results:
+                        winner = owners[task]
+                        self.hedge_stats['backup_wins' if winner is backup else 'primary_wins'] += 1
+                        for loser in pending:
+                            provider = owners[loser]
+                            self.record_abandoned(provider, target_lang, source_lang, time.monotonic() - started[provider])
+                        return results, winner.name, True
+            self.hedge_stats['both_failed'] += 1
+            return None, None, True
+        finally:
+            for task in pending:
+                task.cancel()  # The loser's thread finishes on its own; its result is discarded
+
+    async def translate(self, texts, target_lang, source_lang, run, cheap=False):
+        """Translate through the chain; later providers only see what earlier ones missed.
+
+        With `cheap`, billed providers are left out.
+        """
+        translated = [None] * len(texts)
+        tried = set()
+        if cheap:
+            tried.update(provider.name for provider in self.providers if provider.billed)
+        while True:
+            missing = [i for i, result in enumerate(translated) if not result]
+            candidates = self.route(target_lang, source_lang, exclude=tried)
+            if not missing or not candidates:
+                return translated
+
+            provider = candidates[0]
+            batch = [texts[i] for i in missing]
+            tried.add(provider.name)
+            if HEDGE_ENABLED and len(candidates) > 1:
+                results, winner, hedged = await self.hedged_call(provider, candidates[1], batch, target_lang, source_lang, run)
+                if hedged:
+                    tried.add(candidates[1].name)
+            else:
+                results = await self.call(provider, batch, target_lang, source_lang, run)
+                winner = provider.name
+            if results:
+                for i, result in zip(missing, results):
+                    translated[i] = result
+                logger.info(f"✅ {winner}: {len(missing)} text(s) → {target_lang}")
+
+    def stats(self):
+        stats = {}
+        with self._lock:
+            for provider in self.providers:
+                health = self._health[provider.name]
+                p50, p95 = health.percentile(50), health.percentile(95)
+                calls = self._calls[provider.name]
+                breaker = self.breakers[provider.name]
+                stats[provider.name] = (
+                    f"{breaker.state}, {calls['calls']} calls, {calls['failures']} failed, "
+                    f"p50 {p50 * 1000 if p50 is not None else 0:.0f}ms, "
+                    f"p95 {p95 * 1000 if p95 is not None else 0:.0f}ms, {breaker.trips} trips, "
+                    f"{calls['abandoned']} abandoned, {calls['throttled']} throttled"
+                )
+                if provider.quota is not None:
+                    stats[provider.name] += f", {calls['over_quota']} over quota, {provider.quota.summary()}"
+        return stats
+
+
+# ========== PLACEHOLDERS ==========
+# Tokens providers must not touch, most specific first: code, custom emoji, mentions/channels/timestamps, URLs
+PROTECTED_TOKEN = re.compile(
+    r'```.*?```'
+    r'|`[^`\n]+`'
+    r'|<a?:\w+:\d+>'
+    r'|<(?:@[!&]?|#)\d+>'
+    r'|<t:\d+(?::[tTdDfFR])?>'
+    r'|https?://[^\s<>]+',
+    re.DOTALL
+)
+PLACEHOLDER = re.compile(r'\{\s*(\d+)\s*\}')
+
+
+def protect_tokens(text):
+    """Swap protected tokens for numbered placeholders and normalize whitespace.
+
+    Returns (normalized, tokens). Placeholders are numbered by position, so
+    messages that differ only in who they mention or link share a cache key.
+    """
+    if PLACEHOLDER.search(text):
+        # The text already looks like it has placeholders; leave it alone rather than guess
+        return text, []
+    tokens = []
+
+    def placeholder(match):
+        tokens.append(match.group(0))
+        return f"{{{len(tokens) - 1}}}"
+
+    normalized = PROTECTED_TOKEN.sub(placeholder, text)
+    normalized = re.sub(r'[ \t]+', ' ', normalized)
+    normalized = re.sub(r' ?\n ?', '\n', normalized)
+    normalized = re.sub(r'\n{3,}', '\n\n', normalized)
+    return normalized.strip(), tokens
+
+
+def restore_tokens(translated, tokens):
+    """Put protected tokens back; any placeholder the provider dropped is appended"""
+    if not tokens:
+        return translated
+    used = set()
+
+    def token(match):
+        index = int(match.group(1))
+        if index >= len(tokens):
+            return match.group(0)
+        used.add(index)
+        return tokens[index]
+
+    restored = PLACEHOLDER.sub(token, translated)
+    dropped = [tokens[i] for i in range(len(tokens)) if i not in used]
+    return ' '.join([restored, *dropped]) if dropped else restored
+
+
+# ========== SEGMENTATION ==========
+# Line breaks, or whitespace after sentence-ending punctuation (kept so reassembly is exact)
+SEGMENT_BOUNDARY = re.compile(r'(\s*\n\s*|(?<=[.!?。！？])\s+)')
+# Words whose trailing dot doesn't end a sentence ("Mr. Smith", "vs. Team B")
+ABBREVIATIONS = frozenset({
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'mt', 'vs', 'etc', 'e.g', 'i.e', 'cf', 'approx',
+    'nr', 'vol', 'fig', 'inc', 'ltd', 'co', 'corp', 'dept', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug',
+    'sep', 'sept', 'oct', 'nov', 'dec', 'z.b', 'bzw', 'usw', 'ca', 'sra', 'mme',
+})
+
+
+def ends_sentence(before, after):
+    """Whether punctuation and a space between `before` and `after` really end a sentence"""
+    if after[:1].islower():
+        return False  # "e.g. this", "approx. ten minutes"
+    words = before.split()
+    word = words[-1].rstrip('.').lower() if words else ''
+    # Abbreviations and initials ("J. R. R. Tolkien")
+    return word not in ABBREVIATIONS and not (len(word) == 1 and word.isalpha())
+
+
+def split_segments(text):
+    """Split text into (segments, separators); len(separators) == len(segments) - 1"""
+    parts = SEGMENT_BOUNDARY.split(text)
+    segments, separators = [parts[0]], []
+    for separator, segment in zip(parts[1::2], parts[2::2]):
+        if '\n' in separator or ends_sentence(segments[-1], segment):
+            separators.append(separator)
+            segments.append(segment)
+        else:
+            segments[-1] += separator + segment
+    return segments, separators
+
+
+def join_segments(segments, separators):
+    return ''.join(segment + separator for segment, separator in zip(segments, separators + ['']))
+
+
+def is_translatable(segment):
+    """Segments without letters (numbers, emoji, punctuation) are passed through as-is"""
+    return len(segment) >= 2 and any(char.isalpha() for char in segment)
+
+
 # ========== TRANSLATOR ==========
 class SelectiveTranslator:
     def __init__(self):
-        self.google_translator = GoogleTranslator()
+        self.google_translator = GoogleTranslator(timeout=GOOGLE_TIMEOUT)
         self.user_cooldowns = {}
-        self.translation_cache = {}
+        self.translation_cache = TTLCache()
+        self.cheap_translation_cache = TTLCache(
+            max_entries=CHEAP_CACHE_MAX_ENTRIES, max_bytes=CHEAP_CACHE_MAX_BYTES, ttl=CHEAP_CACHE_TTL_SECONDS
+        )
         self.message_cooldowns = {}  # Track message translations
+        self.enabled_channels = set()  # In-memory mirror of channel_settings
+        self.user_languages = UserLanguageIndex()  # In-memory mirror of user_preferences
+        self._dirty_languages = {}  # Role-derived changes waiting to be persisted
+        self._dirty_lock = threading.Lock()
+        self._pending_translations = {}  # cache_key -> translation_cache row waiting to be written
+        self.cache_table_stats = {'purged': 0}
+        self._pending_lock = threading.Lock()
+        self.role_languages = RoleLanguageIndex()
+        self.audience = LanguageAudience(self)
+        self.local_detector = LocalLanguageDetector()
+        self.priors = LanguagePriors(self.local_detector)
+        self.detection_stats = {'local': 0, 'uncertain': 0, 'remote': 0, 'remote_errors': 0}
+        self.segment_stats = {'messages': 0, 'segments': 0, 'segment_hits': 0, 'chars_sent': 0, 'chars_saved': 0}
+        self.placeholder_stats = {'texts': 0, 'tokens': 0, 'chars_protected': 0, 'tokens_dropped': 0}
+        self.detection_cache = TTLCache(max_entries=DETECTION_CACHE_MAX_ENTRIES, max_bytes=DETECTION_CACHE_MAX_BYTES)
+        self._init_storage()
         self._init_db()
+        self.reload_channel_settings()
+        self._load_user_languages()
         self.deepl_translator = None
         self.deepl_supported = []
+        self.deepl_provider = None
+        self.providers = ProviderChain([GoogleProvider(self.google_translator)])
         self._init_deepl()
         logger.info("✅ Translator initialized")
 
@@ -129,12 +1737,22 @@ class SelectiveTranslator:
         deepl_key = os.getenv('DEEPL_API_KEY')
         if deepl_key:
             try:
+                # Keep worker threads from hanging on a stalled request
+                deepl.http_client.min_connection_timeout = DEEPL_TIMEOUT
+                deepl.http_client.max_network_retries = 1
                 self.deepl_translator = deepl.Translator(deepl_key)
                 self.deepl_supported = [lang.code for lang in self.deepl_translator.get_target_languages()]
+                self.deepl_provider = DeepLProvider(self.deepl_translator, self.deepl_supported, self._to_deepl_code)
+                try:
+                    self.deepl_provider.refresh_usage()
+                except Exception as e:
+                    logger.warning(f"⚠️ DeepL usage unavailable, quota unknown until next refresh: {e}")
+                self.providers.add(self.deepl_provider, first=True)
                 logger.info(f"✅ DeepL initialized with {len(self.deepl_supported)} languages")
             except Exception as e:
                 logger.error(f"❌ DeepL initialization failed: {e}")
                 self.deepl_translator = None
+                self.deepl_provider = None
         else:
             logger.info("ℹ️ No DeepL API key, using Google Translate only")
 
@@ -151,95 +1769,80 @@ class SelectiveTranslator:
         return mapping.get(lang_code, lang_code.upper())
 
 
-    def get_connection(self):
-        """Get database connection - supports both SQLite and PostgreSQL"""
+    def _init_storage(self):
+        """Create the shared database backend once at startup - PostgreSQL pool or SQLite store"""
         database_url = os.environ.get('DATABASE_URL')
 
         if database_url:
             # Use PostgreSQL from Railway
             try:
-                result = urlparse(database_url)
-                conn = psycopg2.connect(
-                    database=result.path[1:],  # Remove leading slash
-                    user=result.username,
-                    password=result.password,
-                    host=result.hostname,
-                    port=result.port,
-                    sslmode='require'  # Railway requires SSL
-                )
+                self.db = PostgresPool(database_url)
                 logger.info("📊 Using PostgreSQL (Railway)")
-                return conn
+                return
             except Exception as e:
                 logger.error(f"❌ PostgreSQL connection error: {e}")
                 logger.info("🔄 Falling back to SQLite...")
 
         # Fallback to SQLite for local development
-        import sqlite3
-        from contextlib import closing
         logger.info("📁 Using SQLite (local)")
-        return closing(sqlite3.connect('translations.db', check_same_thread=False))
+        self.db = SQLiteStore()
 
     def _init_db(self):  # ← ADD THIS INDENTATION!
         """Initialize database tables"""
         try:
-            conn = self.get_connection()
-
-            # SIMPLIFIED: Just check if it's PostgreSQL by trying to create a cursor
-            is_postgres = False
-            try:
-                # Try PostgreSQL style
-                cursor = conn.cursor()
-                is_postgres = True
-            except:
-                # If that fails, it's SQLite
-                is_postgres = False
+            is_postgres = self.db.dialect == 'postgres'
 
             if is_postgres:
-                # PostgreSQL connection
-                cursor = conn.cursor()
-
-                # Simple table creation
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS user_preferences (
-                        user_id BIGINT PRIMARY KEY,
-                        language_code TEXT DEFAULT 'en',
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS channel_settings (
-                        channel_id BIGINT PRIMARY KEY,
-                        enabled BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS translation_cache (
-                        cache_key TEXT PRIMARY KEY,
-                        original_text TEXT,
-                        translated_text TEXT,
-                        target_lang TEXT,
-                        source_lang TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS welcome_channels (
-                        guild_id BIGINT PRIMARY KEY,
-                        channel_id BIGINT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
+                # PostgreSQL connection from the shared pool
+                with self.db.connection() as conn:
+                    cursor = conn.cursor()
 
-                conn.commit()
-                cursor.close()
-                conn.close()
+                    # Simple table creation
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS user_preferences (
+                            user_id BIGINT PRIMARY KEY,
+                            language_code TEXT DEFAULT 'en',
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS channel_settings (
+                            channel_id BIGINT PRIMARY KEY,
+                            enabled BOOLEAN DEFAULT FALSE,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS translation_cache (
+                            cache_key TEXT PRIMARY KEY,
+                            original_text TEXT,
+                            translated_text TEXT,
+                            target_lang TEXT,
+                            source_lang TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+                    # Expiry purge walks created_at; cache_key is included so it never touches the heap
+                    cursor.execute('''
+                        CREATE INDEX IF NOT EXISTS idx_translation_cache_created_at
+                        ON translation_cache (created_at) INCLUDE (cache_key)
+                    ''')
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS welcome_channels (
+                            guild_id BIGINT PRIMARY KEY,
+                            channel_id BIGINT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+
+                    conn.commit()
+                    cursor.close()
                 logger.info("✅ PostgreSQL tables initialized")
             else:
                 # SQLite connection
-                with conn as sqlite_conn:
+                with self.db.connection() as sqlite_conn:
                     cursor = sqlite_conn.cursor()
 
                     cursor.execute('''
@@ -269,6 +1872,11 @@ class SelectiveTranslator:
                         )
                     ''')
 
+                    cursor.execute('''
+                        CREATE INDEX IF NOT EXISTS idx_translation_cache_created_at
+                        ON translation_cache (created_at, cache_key)
+                    ''')
+
                     # For PostgreSQL
                     cursor.execute('''
                         CREATE TABLE IF NOT EXISTS welcome_channels (
@@ -288,149 +1896,392 @@ class SelectiveTranslator:
     def _execute_query(self, query, params=None, fetchone=False, fetchall=False):
         """Helper method to execute queries for both PostgreSQL and SQLite"""
         try:
-            conn = self.get_connection()
-            
-            # Check if it's PostgreSQL or SQLite
-            is_postgres = hasattr(conn, 'cursor') and not hasattr(conn, '__enter__')
-            
-            if is_postgres:
-                # PostgreSQL
-                cursor = conn.cursor()
-                if params:
-                    cursor.execute(query, params)
-                else:
-                    cursor.execute(query)
-                
-                result = None
-                if fetchone:
-                    result = cursor.fetchone()
-                elif fetchall:
-                    result = cursor.fetchall()
-                
-                if not query.strip().upper().startswith('SELECT'):
-                    conn.commit()
-                
-                cursor.close()
-                conn.close()
-                return result
-            else:
-                # SQLite (using context manager)
-                with conn as sqlite_conn:
-                    cursor = sqlite_conn.cursor()
-                    if params:
-                        cursor.execute(query, params)
-                    else:
-                        cursor.execute(query)
-                    
-                    result = None
-                    if fetchone:
-                        result = cursor.fetchone()
-                    elif fetchall:
-                        result = cursor.fetchall()
-                    
-                    if not query.strip().upper().startswith('SELECT'):
-                        sqlite_conn.commit()
-                    
-                    return result
-                    
+            query = self.db.translate(query)
+            # Retry once on a fresh connection if the pooled one died
+            for attempt in range(2):
+                try:
+                    with self.db.connection() as conn:
+                        return self._run_query(conn, query, params, fetchone, fetchall)
+                except self.db.RECONNECT_ERRORS as e:
+                    if attempt:
+                        raise
+                    logger.warning(f"🔄 Database connection lost, retrying: {e}")
+
         except Exception as e:
             logger.error(f"Database query error: {e}")
             return None
 
-    def translate_text(self, text, target_lang, source_lang="auto"):
-        """Translate using DeepL first, fallback to Google Translate."""
+    def _run_query(self, conn, query, params, fetchone, fetchall):
+        cursor = conn.cursor()
         try:
-            text = text.strip()
-            if not text or len(text) < 2:
-                return None
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+
+            result = None
+            if fetchone:
+                result = cursor.fetchone()
+            elif fetchall:
+                result = cursor.fetchall()
+
+            if not query.strip().upper().startswith('SELECT'):
+                conn.commit()
+
+            return result
+        finally:
+            cursor.close()
+
+    def _execute_many(self, query, rows):
+        """Run one `INSERT ... VALUES %s` statement for many rows in a single transaction.
+
+        PostgreSQL expands the placeholder into one multi-row statement; SQLite
+        runs it once per row. Returns True on success.
+        """
+        if not rows:
+            return True
+        if self.db.dialect == 'sqlite':
+            row_placeholder = '(' + ', '.join(['%s'] * len(rows[0])) + ')'
+            query = self.db.translate(query.replace('VALUES %s', f'VALUES {row_placeholder}'))
+
+        try:
+            for attempt in range(2):
+                try:
+                    with self.db.connection() as conn:
+                        cursor = conn.cursor()
+                        try:
+                            if self.db.dialect == 'postgres':
+                                execute_values(cursor, query, rows, page_size=len(rows))
+                            else:
+                                cursor.executemany(query, rows)
+                            conn.commit()
+                        finally:
+                            cursor.close()
+                    return True
+                except self.db.RECONNECT_ERRORS as e:
+                    if attempt:
+                        raise
+                    logger.warning(f"🔄 Database connection lost, retrying: {e}")
+        except Exception as e:
+            logger.error(f"Database batch error: {e}")
+        return False
 
-            cache_key = hashlib.md5(f"{text}:{target_lang}:{source_lang}".encode()).hexdigest()
+    @staticmethod
+    def _cache_key(text, target_lang, source_lang):
+        return hashlib.md5(f"{text}:{target_lang}:{source_lang}".encode()).hexdigest()
 
-            if cache_key in self.translation_cache:
-                return self.translation_cache[cache_key]
+    def lookup_translation(self, cache_key):
+        """Cached translation from memory, then the translation_cache table (blocking)"""
+        cached = self.translation_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        with self._pending_lock:
+            row = self._pending_translations.get(cache_key)
+        if row:
+            return row[2]
 
+        result = self._execute_query(
+            f"SELECT translated_text FROM translation_cache WHERE cache_key = %s AND created_at > CURRENT_TIMESTAMP - INTERVAL '{CACHE_TTL_SECONDS} seconds'",
+            (cache_key,),
+            fetchone=True
+        )
+        if result and result[0]:
+            self.translation_cache.set(cache_key, result[0])
+            return result[0]
+        return None
+
+    def protect(self, text):
+        """protect_tokens() with bookkeeping"""
+        normalized, tokens = protect_tokens(text)
+        if tokens:
+            self.placeholder_stats['texts'] += 1
+            self.placeholder_stats['tokens'] += len(tokens)
+            self.placeholder_stats['chars_protected'] += sum(len(token) for token in tokens)
+        return normalized, tokens
+
+    def restore(self, translated, tokens):
+        """restore_tokens() with bookkeeping"""
+        if tokens:
+            kept = {int(index) for index in PLACEHOLDER.findall(translated)}
+            self.placeholder_stats['tokens_dropped'] += len(set(range(len(tokens))) - kept)
+        return restore_tokens(translated, tokens)
+
+    def lookup_translations(self, cache_keys):
+        """{cache_key: translation} for the keys found in memory, the write queue or the table (blocking)"""
+        found = {}
+        missing = []
+        for cache_key in cache_keys:
+            cached = self.translation_cache.get(cache_key)
+            if cached is None:
+                with self._pending_lock:
+                    row = self._pending_translations.get(cache_key)
+                cached = row[2] if row else None
+            if cached is not None:
+                found[cache_key] = cached
+            else:
+                missing.append(cache_key)
+        if not missing:
+            return found
+
+        if self.db.dialect == 'postgres':
+            key_filter, params = "cache_key = ANY(%s)", (missing,)
+        else:
+            key_filter, params = f"cache_key IN ({', '.join(['%s'] * len(missing))})", tuple(missing)
+        rows = self._execute_query(
+            f"SELECT cache_key, translated_text FROM translation_cache WHERE {key_filter} "
+            f"AND created_at > CURRENT_TIMESTAMP - INTERVAL '{CACHE_TTL_SECONDS} seconds'",
+            params,
+            fetchall=True
+        )
+        for cache_key, translated in rows or ():
+            if translated:
+                self.translation_cache.set(cache_key, translated)
+                found[cache_key] = translated
+        return found
+
+    def plan_segments(self, text, target_lang, source_lang):
+        """(segments, separators, {segment: cache_key}) when `text` is cached per segment, else None"""
+        if len(text) < SEGMENT_MIN_CHARS:
+            return None
+        segments, separators = split_segments(text)
+        if len(segments) < 2:
+            return None
+        keys = {
+            segment: self._cache_key(segment, target_lang, source_lang)
+            for segment in segments if is_translatable(segment)
+        }
+        return segments, separators, keys
+
+    def assemble_segments(self, plan, found, missing):
+        """Reassemble a planned message from segment translations (keyed by cache_key)"""
+        segments, separators, keys = plan
+        self.segment_stats['messages'] += 1
+        self.segment_stats['segments'] += len(keys)
+        self.segment_stats['segment_hits'] += len(keys) - len(missing)
+        self.segment_stats['chars_sent'] += sum(len(segment) for segment in missing)
+        self.segment_stats['chars_saved'] += sum(len(segment) for segment in keys if segment not in missing)
+        translated = [found[keys[segment]] if segment in keys else segment for segment in segments]
+        return join_segments(translated, separators)
+
+    def store_translation(self, cache_key, text, translated, target_lang, source_lang):
+        """Cache a fresh translation in memory and queue it for the table (never blocks on the DB).
+
+        Returns the number of rows waiting for flush_translations().
+        """
+        self.translation_cache.set(cache_key, translated)
+        with self._pending_lock:
+            if len(self._pending_translations) < TRANSLATION_PENDING_MAX:
+                original = text if CACHE_STORE_ORIGINAL_TEXT else None
+                self._pending_translations[cache_key] = (cache_key, original, translated, target_lang, source_lang)
+            return len(self._pending_translations)
+
+    def flush_translations(self):
+        """Write queued translations with one batched upsert (blocking)"""
+        with self._pending_lock:
+            pending, self._pending_translations = self._pending_translations, {}
+        if not pending:
+            return 0
+
+        ok = self._execute_many(
+            '''INSERT INTO translation_cache (cache_key, original_text, translated_text, target_lang, source_lang)
+               VALUES %s
+               ON CONFLICT (cache_key) DO UPDATE SET
+                   translated_text = EXCLUDED.translated_text,
+                   created_at = CURRENT_TIMESTAMP''',
+            list(pending.values())
+        )
+        if not ok:
+            # Put them back for the next flush unless newer rows were queued meanwhile
+            with self._pending_lock:
+                for cache_key, row in pending.items():
+                    if len(self._pending_translations) >= TRANSLATION_PENDING_MAX:
+                        break
+                    self._pending_translations.setdefault(cache_key, row)
+            return 0
+
+        logger.info(f"💾 Saved {len(pending)} translation(s) to the cache table")
+        return len(pending)
+
+    def purge_translation_cache(self):
+        """Delete expired translation_cache rows, CACHE_PURGE_BATCH at a time (blocking).
+
+        Short transactions keep lookups and write-behind flushes flowing while a
+        large backlog is worked off over several runs.
+        """
+        query = self.db.translate(
+            f'''DELETE FROM translation_cache WHERE cache_key IN (
+                   SELECT cache_key FROM translation_cache
+                   WHERE created_at < CURRENT_TIMESTAMP - INTERVAL '{CACHE_TTL_SECONDS} seconds'
+                   ORDER BY created_at LIMIT %s)'''
+        )
+        start = time.monotonic()
+        deleted = 0
+        try:
+            for _ in range(CACHE_PURGE_MAX_BATCHES):
+                with self.db.connection() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        cursor.execute(query, (CACHE_PURGE_BATCH,))
+                        count = cursor.rowcount
+                        conn.commit()
+                    finally:
+                        cursor.close()
+                deleted += count
+                if count < CACHE_PURGE_BATCH:
+                    break
+        except Exception as e:
+            logger.error(f"Translation cache purge error: {e}")
+
+        elapsed = time.monotonic() - start
+        stats = self.cache_table_stats
+        stats['purged'] += deleted
+        stats['last_purge'] = f"{deleted:,} rows in {elapsed:.2f}s ({deleted / elapsed if elapsed else 0:,.0f} rows/s)"
+        stats.update(self._cache_table_size())
+        if deleted:
+            logger.info(f"🧹 Purged {deleted:,} expired translation(s)")
+        return deleted
+
+    def _cache_table_size(self):
+        """Row count and on-disk size of translation_cache (estimates on PostgreSQL)"""
+        if self.db.dialect == 'postgres':
+            result = self._execute_query(
+                """SELECT GREATEST(reltuples, 0)::BIGINT, pg_total_relation_size(oid)
+                   FROM pg_class WHERE relname = 'translation_cache'""",
+                fetchone=True
+            )
+        else:
             result = self._execute_query(
-                "SELECT translated_text FROM translation_cache WHERE cache_key = %s AND created_at > CURRENT_TIMESTAMP - INTERVAL '1 day'",
-                (cache_key,),
+                '''SELECT (SELECT COUNT(*) FROM translation_cache),
+                          (SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size())''',
                 fetchone=True
             )
-            if result and result[0]:
-                self.translation_cache[cache_key] = result[0]
-                return result[0]
+        if not result:
+            return {}
+        rows, size = result
+        # SQLite can only report the whole database file
+        label = 'table_size' if self.db.dialect == 'postgres' else 'database_size'
+        return {'rows': f"{rows:,}", label: f"{(size or 0) / 1024 / 1024:.1f} MB"}
+
+    def _load_user_languages(self):
+        """Bulk-load user_preferences into the language index if it fits in memory"""
+        result = self._execute_query("SELECT COUNT(*) FROM user_preferences", fetchone=True)
+        if result is None:
+            logger.warning("⚠️ Could not count user preferences, language index starts empty")
+            return
 
-            translated = None
+        if result[0] > self.user_languages.max_entries:
+            logger.info(f"👥 {result[0]} user preferences exceed the index budget, using batched lookups")
+            return
 
-            # ----- DeepL -----
-            if self.deepl_translator:
-                deepl_target = self._to_deepl_code(target_lang)
-                if deepl_target in self.deepl_supported:
-                    try:
-                        deepl_source = None if source_lang == 'auto' else self._to_deepl_code(source_lang)
-                        if deepl_source and deepl_source not in self.deepl_supported:
-                            deepl_source = None
-                        result = self.deepl_translator.translate_text(
-                            text,
-                            target_lang=deepl_target,
-                            source_lang=deepl_source
-                        )
-                        if result and result.text:
-                            translated = result.text
-                            logger.info(f"✅ DeepL: '{text[:30]}...' → {target_lang}")
-                    except deepl.DeepLException as e:
-                        logger.warning(f"DeepL error (fallback to Google): {e}")
-                    except Exception as e:
-                        logger.warning(f"Unexpected DeepL error: {e}")
-
-            # ----- Google fallback -----
-            if not translated:
-                logger.info(f"🔄 Using Google Translate for {target_lang}")
-                google_result = self.google_translator.translate(text, dest=target_lang, src=source_lang)
-                if google_result and google_result.text:
-                    translated = google_result.text
+        rows = self._execute_query("SELECT user_id, language_code FROM user_preferences", fetchall=True)
+        if rows is not None:
+            self.user_languages.load(rows)
+            logger.info(f"👥 Loaded {len(rows)} user language preferences")
+
+    def _language_from_roles(self, member):
+        """Language code of the member's language role, if they have one"""
+        return self.role_languages.resolve(member)
+
+    def get_stored_languages(self, user_ids):
+        """Stored preference (or None) for each user id, with at most one query per batch of misses"""
+        languages = {}
+        missing = []
+        for user_id in user_ids:
+            language_code = self.user_languages.get(user_id)
+            if language_code is UserLanguageIndex.UNKNOWN:
+                missing.append(user_id)
+            else:
+                languages[user_id] = language_code
 
-            if translated:
-                self.translation_cache[cache_key] = translated
-                self._execute_query(
-                    '''INSERT INTO translation_cache (cache_key, original_text, translated_text, target_lang, source_lang)
-                       VALUES (%s, %s, %s, %s, %s)
-                       ON CONFLICT (cache_key) DO UPDATE SET
-                           translated_text = EXCLUDED.translated_text,
-                           created_at = CURRENT_TIMESTAMP''',
-                    (cache_key, text, translated, target_lang, source_lang)
-                )
-                return translated
+        for i in range(0, len(missing), USER_INDEX_BATCH_SIZE):
+            batch = missing[i:i + USER_INDEX_BATCH_SIZE]
+            if self.db.dialect == 'postgres':
+                query = "SELECT user_id, language_code FROM user_preferences WHERE user_id = ANY(%s)"
+                params = (batch,)
+            else:
+                query = f"SELECT user_id, language_code FROM user_preferences WHERE user_id IN ({', '.join(['%s'] * len(batch))})"
+                params = tuple(batch)
 
-            return None
+            rows = self._execute_query(query, params, fetchall=True)
+            if rows is None:
+                # Lookup failed - answer without caching so the next message retries
+                languages.update({user_id: None for user_id in batch})
+                continue
 
-        except Exception as e:
-            logger.error(f"Translation error: {e}")
-            return None
+            found = dict(rows)
+            for user_id in batch:
+                languages[user_id] = found.get(user_id)
+                self.user_languages.set(user_id, found.get(user_id))
+
+        return languages
+
+    def _remember_role_language(self, user_id, language_code):
+        """Queue a role-derived preference for persistence, but only if it changed"""
+        if self.user_languages.get(user_id) == language_code:
+            return
+        self.user_languages.set(user_id, language_code)
+        with self._dirty_lock:
+            self._dirty_languages[user_id] = language_code
+        logger.debug(f"🎯 Language from role changed: {language_code} for user {user_id}")
+
+    def flush_user_languages(self):
+        """Persist queued role-derived preferences with one batched upsert"""
+        with self._dirty_lock:
+            pending, self._dirty_languages = self._dirty_languages, {}
+        if not pending:
+            return 0
+
+        ok = self._execute_many(
+            '''INSERT INTO user_preferences (user_id, language_code)
+               VALUES %s
+               ON CONFLICT (user_id) DO UPDATE SET
+                   language_code = EXCLUDED.language_code,
+                   updated_at = CURRENT_TIMESTAMP''',
+            list(pending.items())
+        )
+        if not ok:
+            # Put them back for the next flush unless a newer value was queued meanwhile
+            with self._dirty_lock:
+                for user_id, language_code in pending.items():
+                    self._dirty_languages.setdefault(user_id, language_code)
+            return 0
+
+        logger.info(f"💾 Saved {len(pending)} role-derived language preference(s)")
+        return len(pending)
 
     def get_user_language(self, user_id, guild=None):
-        """Get user's preferred language - UPDATED TO CHECK ROLES"""
+        """Get user's preferred language - language roles win over the stored preference (never writes)"""
         # If guild is provided, check for language roles first
         if guild:
             member = guild.get_member(user_id)
             if member:
                 # Check if user has any language role
-                for role in member.roles:
-                    for lang_code, lang_info in LANGUAGES.items():
-                        if role.name == lang_info['role_name']:
-                            # Update database with this preference
-                            self.set_user_language(user_id, lang_code)
-                            logger.info(f"🎯 Auto-detected language from role: {lang_code} for user {member.name}")
-                            return lang_code
+                lang_code = self._language_from_roles(member)
+                if lang_code:
+                    self._remember_role_language(user_id, lang_code)
+                    return lang_code
         
-        # Fall back to database preference
-        result = self._execute_query(
-            "SELECT language_code FROM user_preferences WHERE user_id = %s",
-            (user_id,),
-            fetchone=True
-        )
-        return result[0] if result else 'en'
+        # Fall back to stored preference
+        return self.get_stored_languages([user_id])[user_id] or 'en'
+
+    def get_user_languages(self, members, guild=None):
+        """Resolve the preferred language of a whole member list in one call"""
+        languages = {}
+        for member in members:
+            lang_code = self._language_from_roles(member)
+            if lang_code:
+                self._remember_role_language(member.id, lang_code)
+                languages[member.id] = lang_code
+
+        stored = self.get_stored_languages([member.id for member in members if member.id not in languages])
+        for user_id, lang_code in stored.items():
+            languages[user_id] = lang_code or 'en'
+        return languages
 
     def set_user_language(self, user_id, language_code):
         """Save user's language preference"""
+        with self._dirty_lock:
+            self._dirty_languages.pop(user_id, None)  # This write supersedes any queued one
         self._execute_query(
             '''INSERT INTO user_preferences (user_id, language_code)
                VALUES (%s, %s)
@@ -439,9 +2290,29 @@ class SelectiveTranslator:
                    updated_at = CURRENT_TIMESTAMP''',
             (user_id, language_code)
         )
+        self.user_languages.set(user_id, language_code)
+        self.audience.user_language_changed(user_id)
+
+    def reload_channel_settings(self):
+        """(Re)load enabled channels from the database; returns the number of changes"""
+        result = self._execute_query(
+            "SELECT channel_id FROM channel_settings WHERE enabled = TRUE",
+            fetchall=True
+        )
+        if result is None:
+            logger.warning("⚠️ Could not load channel settings, keeping current registry")
+            return 0
+
+        loaded = {row[0] for row in result}
+        changes = len(loaded ^ self.enabled_channels)
+        self.enabled_channels = loaded
+        if changes:
+            logger.info(f"🔁 Channel registry reloaded: {len(loaded)} enabled ({changes} changed)")
+        return changes
 
     def enable_channel(self, channel_id):
         """Enable auto-translate for a channel"""
+        self.enabled_channels.add(channel_id)
         self._execute_query(
             '''INSERT INTO channel_settings (channel_id, enabled)
                VALUES (%s, TRUE)
@@ -453,6 +2324,7 @@ class SelectiveTranslator:
 
     def disable_channel(self, channel_id):
         """Disable auto-translate for a channel"""
+        self.enabled_channels.discard(channel_id)
         self._execute_query(
             '''INSERT INTO channel_settings (channel_id, enabled)
                VALUES (%s, FALSE)
@@ -462,32 +2334,51 @@ class SelectiveTranslator:
         )
 
     def is_channel_enabled(self, channel_id):
-        """Check if auto-translate is enabled for channel"""
-        result = self._execute_query(
-            "SELECT enabled FROM channel_settings WHERE channel_id = %s",
-            (channel_id,),
-            fetchone=True
-        )
-        return bool(result[0]) if result else False
+        """Check if auto-translate is enabled for channel (in-memory, no I/O)"""
+        return channel_id in self.enabled_channels
+
+    @staticmethod
+    def _detection_key(text):
+        return ' '.join(text.lower().split())
+
+    def cached_detection(self, text):
+        """Previously detected language of this (normalized) text, or None"""
+        return self.detection_cache.get(self._detection_key(text))
+
+    def remember_detection(self, text, lang_code):
+        self.detection_cache.set(self._detection_key(text), lang_code)
+
+    def detect_language_local(self, text):
+        """Offline detection - (lang_code, confidence), microseconds, no network"""
+        text = text.strip()
+        if len(text) < 2:
+            return 'en', 1.0
+
+        lang_code, confidence = self.local_detector.detect(text)
+        if lang_code is None:
+            return 'en', 1.0  # No letters at all (emoji, numbers) - nothing to detect
+        if confidence >= LOCAL_DETECTION_MIN_CONFIDENCE:
+            self.detection_stats['local'] += 1
+        else:
+            self.detection_stats['uncertain'] += 1
+        return lang_code, confidence
 
-    # Keep all other methods exactly the same
-    def detect_language(self, text):
-        """Detect language of text"""
+    def detect_language_remote(self, text):
+        """Detect language with Google (network); None when that fails"""
+        self.detection_stats['remote'] += 1
         try:
-            text = text.strip()
-            if len(text) < 2:
-                return 'en'
-            
-            detection = self.google_translator.detect(text)
+            detection = self.google_translator.detect(text.strip())
             if detection and detection.lang:
                 lang_code = detection.lang
+                if isinstance(lang_code, list):
+                    lang_code = lang_code[0]
                 if '-' in lang_code:
                     lang_code = lang_code.split('-')[0]
                 return lang_code
-            return 'en'
         except Exception as e:
             logger.error(f"Language detection error: {e}")
-            return 'en'
+        self.detection_stats['remote_errors'] += 1
+        return None
 
     def should_translate_for_user(self, message_lang, user_lang, user_id, message_author_id):
         """Determine if we should translate for a user"""
@@ -529,21 +2420,648 @@ class SelectiveTranslator:
         self.message_cooldowns[message_id] = now
         return True
 
+# ========== FAIR SHARE SCHEDULING ==========
+class GuildScheduler:
+    """Weighted fair share of auto-translation capacity between guilds.
+
+    Characters and translations are counted per guild over a sliding
+    GUILD_SHARE_WINDOW. The window's capacity is split between the guilds
+    active in it in proportion to their weight, and a guild's load (usage
+    over its share) decides how its next message is handled: translated
+    normally, degraded (cheapest provider, largest language groups only),
+    deferred until the window drains, or skipped.
+    """
+
+    def __init__(self, window=GUILD_SHARE_WINDOW, max_chars=GUILD_SHARE_CHARS,
+                 max_requests=GUILD_SHARE_REQUESTS, weights=None):
+        self.window = window
+        self.max_chars = max_chars
+        self.max_requests = max_requests
+        self.weights = dict(GUILD_WEIGHTS if weights is None else weights)
+        self._events = {}  # guild_id -> deque of (timestamp, chars, requests)
+        self._usage = {}  # guild_id -> [chars, requests] inside the window
+        self._decisions = {}  # guild_id -> Counter of decisions since startup
+        self.stats = {'full': 0, 'degraded': 0, 'deferred': 0, 'skipped': 0}
+
+    def _expire(self, now):
+        for guild_id in list(self._events):
+            events = self._events[guild_id]
+            usage = self._usage[guild_id]
+            while events and now - events[0][0] > self.window:
+                _, chars, requests = events.popleft()
+                usage[0] -= chars
+                usage[1] -= requests
+            if not events:
+                del self._events[guild_id]
+                del self._usage[guild_id]
+
+    def weight(self, guild_id):
+        return self.weights.get(guild_id, 1.0)
+
+    def share(self, guild_id):
+        """This guild's fraction of capacity, counting it as active"""
+        active = set(self._events) | {guild_id}
+        return self.weight(guild_id) / sum(self.weight(g) for g in active)
+
+    def load(self, guild_id, chars=0, requests=0):
+        """Usage (plus a prospective message) over fair share; 1.0 means exactly at share"""
+        self._expire(time.monotonic())
+        used_chars, used_requests = self._usage.get(guild_id, (0, 0))
+        share = self.share(guild_id)
+        return max(
+            (used_chars + chars) / (self.max_chars * share),
+            (used_requests + requests) / (self.max_requests * share),
+        )
+
+    def decide(self, guild_id, chars, requests):
+        load = self.load(guild_id, chars, requests)
+        if load > GUILD_SKIP_AT:
+            return 'skipped'
+        if load > GUILD_DEFER_AT:
+            return 'deferred'
+        if load > GUILD_DEGRADE_AT:
+            return 'degraded'
+        return 'full'
+
+    async def admit(self, guild_id, chars, requests, while_deferred=nullcontext):
+        """Decide how to handle one message; waits out a deferral before answering.
+
+        The wait runs inside `while_deferred()`, so the caller can give back
+        shared resources (its pipeline slot) instead of charging a heavy
+        guild's backlog to everyone. Returns 'full', 'degraded' or 'skipped'.
+        """
+        decision = self.decide(guild_id, chars, requests)
+        if decision == 'deferred':
+            self._count(guild_id, 'deferred')
+            deadline = time.monotonic() + GUILD_DEFER_MAX_SECONDS
+            async with while_deferred():
+                while decision == 'deferred' and time.monotonic() < deadline:
+                    await asyncio.sleep(1)
+                    decision = self.decide(guild_id, chars, requests)
+            if decision == 'deferred':
+                decision = 'degraded'  # Waited long enough; translate cheaply rather than not at all
+        self._count(guild_id, decision)
+        return decision
+
+    def _count(self, guild_id, decision):
+        self.stats[decision] += 1
+        self._decisions.setdefault(guild_id, Counter())[decision] += 1
+
+    def record(self, guild_id, chars, requests):
+        """Charge a message's translations to its guild"""
+        now = time.monotonic()
+        self._events.setdefault(guild_id, deque()).append((now, chars, requests))
+        usage = self._usage.setdefault(guild_id, [0, 0])
+        usage[0] += chars
+        usage[1] += requests
+
+    def usage(self, guild_id):
+        """Per-guild report for admins"""
+        load = self.load(guild_id)
+        used_chars, used_requests = self._usage.get(guild_id, (0, 0))
+        share = self.share(guild_id)
+        decisions = self._decisions.get(guild_id, Counter())
+        return {
+            'window': f"last {self.window}s",
+            'characters': f"{used_chars:,} / {int(self.max_chars * share):,}",
+            'translations': f"{used_requests:,} / {int(self.max_requests * share):,}",
+            'share': f"{share:.0%} (weight {self.weight(guild_id):g}, {len(set(self._events) | {guild_id})} active guilds)",
+            'load': f"{load:.0%}",
+            'messages': ", ".join(f"{decisions[key]} {key}" for key in self.stats),
+        }
+
+    def summary(self):
+        self._expire(time.monotonic())
+        return {'active_guilds': len(self._events), **self.stats}
+
+
+# ========== ASYNC TRANSLATION SERVICE ==========
+class LoadShedder:
+    """Bounded auto-translation pipeline with stepwise degradation.
+
+    The level is the worse of two signals: how full the pipeline is
+    (messages admitted but not finished) and event-loop lag sampled by
+    loop_lag_monitor. See SHED_DEPTH_LEVELS / SHED_LAG_LEVELS.
+    """
+
+    LEVELS = ('normal', 'largest languages only', 'cheapest provider', 'active users only', 'skip')
+
+    def __init__(self, capacity=AUTO_PIPELINE_MAX):
+        self.capacity = capacity
+        self.depth = 0
+        self.lag = 0.0
+        self.level = 0
+        self.handled = Counter()  # level -> messages handled (or skipped) at it
+        self.stats = {'transitions': 0, 'peak_depth': 0, 'peak_lag_ms': 0}
+
+    def _update(self):
+        fill = self.depth / self.capacity
+        level = max(
+            sum(fill >= threshold for threshold in SHED_DEPTH_LEVELS),
+            sum(self.lag >= threshold for threshold in SHED_LAG_LEVELS),
+        )
+        if level == self.level:
+            return
+        message = (f"level {level} ({self.LEVELS[level]}): {self.depth}/{self.capacity} in pipeline, "
+                   f"loop lag {self.lag * 1000:.0f}ms")
+        if level > self.level:
+            logger.warning(f"🚨 Load shedding up to {message}")
+        else:
+            logger.info(f"✅ Load shedding down to {message}")
+        self.level = level
+        self.stats['transitions'] += 1
+
+    def observe_lag(self, lag):
+        """Smoothed so one slow callback doesn't flip levels"""
+        self.lag = lag if lag > self.lag else (self.lag + lag) / 2
+        self.stats['peak_lag_ms'] = max(self.stats['peak_lag_ms'], round(lag * 1000))
+        self._update()
+
+    def admit(self):
+        """Take a pipeline slot for one message; False means skip it"""
+        if self.level >= len(self.LEVELS) - 1 or self.depth >= self.capacity:
+            self.handled[len(self.LEVELS) - 1] += 1
+            return False
+        self.depth += 1
+        self.stats['peak_depth'] = max(self.stats['peak_depth'], self.depth)
+        self._update()
+        return True
+
+    def release(self):
+        self.depth -= 1
+        self._update()
+
+    @asynccontextmanager
+    async def suspended(self):
+        """Hand the pipeline slot back while a message waits outside the pipeline"""
+        self.release()
+        try:
+            yield
+        finally:
+            # Already admitted, so it comes back regardless of the current level
+            self.depth += 1
+            self._update()
+
+    def summary(self):
+        return {
+            'level': f"{self.level} ({self.LEVELS[self.level]})",
+            'pipeline': f"{self.depth}/{self.capacity}",
+            'loop_lag': f"{self.lag * 1000:.0f}ms",
+            **self.stats,
+            'messages': ", ".join(f"{self.handled[level]} at {level}" for level in range(len(self.LEVELS))),
+        }
+
+
+class PriorityGate:
+    """Concurrency limit whose waiters are served by lane priority, then arrival order."""
+
+    def __init__(self, limit=PROVIDER_CONCURRENCY, lanes=LANES):
+        self.limit = limit
+        self.lanes = lanes
+        self.active = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self.waiting = {lane: 0 for lane in lanes}
+
+    async def acquire(self, lane):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (self.lanes[lane][0], next(self._seq), future))
+        self.waiting[lane] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # Handed a slot just as we were cancelled; pass it on
+            raise
+        finally:
+            self.waiting[lane] -= 1
+
+    def release(self):
+        """Hand the slot to the best waiter, or free it"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():  # Skip waiters that gave up
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, lane):
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class TranslationBatcher:
+    """Micro-batching stage in front of the providers.
+
+    Texts are collected per (source, target) pair for BATCH_WINDOW_SECONDS, or
+    until BATCH_MAX_SIZE texts / BATCH_MAX_CHARS characters are waiting, then
+    sent as one call through the provider chain whose results resolve each caller's future.
+    Interactive texts skip the window, and every batch waits for a provider
+    slot in its lane's priority.
+    """
+
+    def __init__(self, service, window=BATCH_WINDOW_SECONDS, max_size=BATCH_MAX_SIZE, max_chars=BATCH_MAX_CHARS):
+        self.service = service
+        self.window = window
+        self.max_size = max_size
+        self.max_chars = max_chars
+        self._pending = {}  # (source, target, cheap, lane) -> [(text, future), ...]
+        self._pending_chars = {}
+        self._timers = {}
+        self._sending = set()  # Keep references to in-flight batch tasks
+        self._sent = set()  # Futures whose text is with a provider right now
+        self.stats = {'texts': 0, 'batches': 0, 'largest_batch': 0, 'size_flushes': 0, 'abandoned': 0}
+
+    def submit(self, text, target_lang, source_lang, cheap=False, lane='auto'):
+        """Queue one text; returns a future for its translation (None on failure).
+
+        Cancelling the future takes the text out of its batch if it hasn't been sent yet.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (source_lang, target_lang, cheap, lane)
+        self._pending.setdefault(key, []).append((text, future))
+        self._pending_chars[key] = self._pending_chars.get(key, 0) + len(text)
+        self.stats['texts'] += 1
+
+        if len(self._pending[key]) >= self.max_size or self._pending_chars[key] >= self.max_chars:
+            self.stats['size_flushes'] += 1
+            self._flush(key)
+        elif key not in self._timers:
+            # Interactive texts only wait for others submitted in the same loop tick
+            delay = 0 if lane == 'interactive' else self.window
+            self._timers[key] = loop.call_later(delay, self._flush, key)
+        return future
+
+    def sent(self, future):
+        """Whether `future`'s text already reached a provider (too late to move it to another batch)"""
+        return future.done() or future in self._sent
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        self._pending_chars.pop(key, None)
+        if batch:
+            task = asyncio.create_task(self._send(key, batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, key, batch):
+        source_lang, target_lang, cheap, lane = key
+        if not await self._slot_unless_abandoned(lane, [future for _, future in batch]):
+            self.stats['abandoned'] += 1
+            return
+        try:
+            # Callers that gave up while we queued don't need translating; duplicates are sent once
+            batch = [(text, future) for text, future in batch if not future.done()]
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            if not texts:
+                self.stats['abandoned'] += 1
+                return
+
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(texts))
+            futures = [future for _, future in batch]
+            self._sent.update(futures)
+            try:
+                results = await self.service.translator.providers.translate(
+                    texts, target_lang, source_lang, self.service.run_provider, cheap=cheap
+                )
+            except Exception as e:
+                logger.warning(f"Batch translation to {target_lang} failed ({len(texts)} texts): {e!r}")
+                results = [None] * len(texts)
+            finally:
+                self._sent.difference_update(futures)
+        finally:
+            self.service.gate.release()
+
+        by_text = dict(zip(texts, results))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text.get(text))
+
+    async def _slot_unless_abandoned(self, lane, futures):
+        """Wait for a provider slot; False (holding no slot) if every caller gives up first"""
+        acquire = asyncio.ensure_future(self.service.gate.acquire(lane))
+        abandoned = asyncio.ensure_future(asyncio.wait(futures))
+        try:
+            await asyncio.wait({acquire, abandoned}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            abandoned.cancel()
+            if not acquire.done():
+                acquire.cancel()  # Leaves the gate's queue; a slot handed over meanwhile is passed on
+        return acquire.done() and not acquire.cancelled()
+
+    def queued(self, lane):
+        """Texts waiting for their batch window in this lane"""
+        return sum(len(batch) for key, batch in self._pending.items() if key[3] == lane)
+
+
+class Flight:
+    """One translation in progress, shared by every concurrent request for it.
+
+    The flight runs in the most urgent lane and best provider tier any of its
+    callers asked for: a request that joins with a higher one promotes it,
+    moving texts that haven't reached a provider yet.
+    """
+
+    def __init__(self, lane, cheap):
+        self.lane = lane
+        self.cheap = cheap
+        self.task = None
+        self.waiters = 0  # Callers still awaiting the result
+        self.promoted = None  # Future resolved when lane or tier is raised
+
+    def promote(self, lane, cheap):
+        raised = False
+        if LANES[lane][0] < LANES[self.lane][0]:
+            self.lane, raised = lane, True
+        if self.cheap and not cheap:
+            self.cheap, raised = False, True
+        if raised and self.promoted is not None and not self.promoted.done():
+            self.promoted.set_result(None)
+
+
+class TranslationService:
+    """Async front-end for SelectiveTranslator.
+
+    Provider and database calls are blocking, so they run on a bounded thread
+    pool with per-call timeouts instead of on the gateway event loop.
+    """
+
+    def __init__(self, translator, max_workers=TRANSLATION_WORKERS):
+        self.translator = translator
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='translator')
+        self.provider_executor = ThreadPoolExecutor(max_workers=PROVIDER_WORKERS, thread_name_prefix='provider')
+        self.batcher = TranslationBatcher(self)
+        self.gate = PriorityGate()
+        self._inflight = {}  # cache_key -> Flight shared by concurrent identical requests
+        self._flush_task = None
+        self.stats = {'calls': 0, 'timeouts': 0, 'errors': 0, 'coalesced': 0}
+        self._lane_latency = {lane: deque(maxlen=LANE_LATENCY_WINDOW) for lane in LANES}
+        self._lane_missed = {lane: 0 for lane in LANES}
+
+    async def run(self, func, *args, timeout=None, executor=None):
+        """Run a blocking call on the worker pool (or `executor`).
+
+        On timeout the awaiting side is cancelled (a call still queued is dropped);
+        a call already running finishes in the background within the client timeout.
+        """
+        self.stats['calls'] += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor or self.executor, functools.partial(func, *args))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+    async def run_provider(self, func, *args, timeout=None):
+        """run() on the provider pool, so slow providers can't starve database calls"""
+        return await self.run(func, *args, timeout=timeout, executor=self.provider_executor)
+
+    async def translate(self, text, target_lang, source_lang="auto", timeout=TRANSLATION_TIMEOUT,
+                        cheap=False, lane='auto'):
+        """Translate without blocking the event loop; None on timeout or failure.
+
+        `cheap` keeps a provider call off billed providers (cache hits are still used);
+        `lane` is 'interactive' for user-initiated requests, 'auto' for channel fan-out.
+        """
+        text = text.strip()
+        if len(text) < 2:
+            return None
+        # Mentions, emoji, URLs and code are kept out of the provider call and the cache key
+        text, tokens = self.translator.protect(text)
+        if not is_translatable(text):
+            return None
+        start = time.monotonic()
+        try:
+            translated = await asyncio.wait_for(self._translate(text, target_lang, source_lang, cheap, lane), timeout)
+            return self.translator.restore(translated, tokens) if translated else None
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Translation to {target_lang} timed out after {timeout}s")
+        except Exception as e:
+            logger.error(f"Translation error: {e}")
+        finally:
+            self._record_lane(lane, time.monotonic() - start)
+        return None
+
+    def _record_lane(self, lane, latency):
+        self._lane_latency[lane].append(latency)
+        if latency > LANES[lane][1]:
+            self._lane_missed[lane] += 1
+
+    def lane_stats(self):
+        stats = {}
+        for lane, (_, target) in LANES.items():
+            latencies = sorted(self._lane_latency[lane])
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0
+            stats[lane] = (
+                f"{self.gate.waiting[lane] + self.batcher.queued(lane)} queued, "
+                f"p95 {p95 * 1000:.0f}ms (target {target * 1000:.0f}ms), "
+                f"{self._lane_missed[lane]} over target"
+            )
+        stats['provider_slots'] = f"{self.gate.active}/{self.gate.limit} busy"
+        return stats
+
+    async def _translate(self, text, target_lang, source_lang, cheap=False, lane='auto'):
+        cache_key = self.translator._cache_key(text, target_lang, source_lang)
+        cached = self.translator.translation_cache.get(cache_key)
+        if cached is None and cheap:
+            cached = self.translator.cheap_translation_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Single-flight: concurrent requests for the same key share one lookup/provider call.
+        # An interactive or full-tier request joining an auto or cheap flight promotes it,
+        # so it never inherits a worse queue position or cheap-only routing.
+        flight = self._inflight.get(cache_key)
+        if flight is not None:
+            self.stats['coalesced'] += 1
+            flight.promote(lane, cheap)
+        else:
+            flight = self._inflight[cache_key] = Flight(lane, cheap)
+            flight.task = asyncio.ensure_future(self._translate_uncached(flight, cache_key, text, target_lang, source_lang))
+            flight.task.add_done_callback(functools.partial(self._inflight_done, cache_key))
+
+        flight.waiters += 1
+        try:
+            # Shielded so one caller timing out doesn't cancel the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # The last caller gave up: drop the queued batcher/gate work instead of translating for nobody
+                self._inflight.pop(cache_key, None)
+                flight.task.cancel()
+
+    def _inflight_done(self, cache_key, task):
+        flight = self._inflight.get(cache_key)
+        if flight is not None and flight.task is task:
+            del self._inflight[cache_key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller gave up
+
+    async def _translate_uncached(self, flight, cache_key, text, target_lang, source_lang):
+        plan = self.translator.plan_segments(text, target_lang, source_lang)
+        if plan:
+            return await self._translate_segments(flight, cache_key, plan, target_lang, source_lang)
+
+        cached = await self.run(self.translator.lookup_translation, cache_key)
+        if cached:
+            return cached
+
+        (translated,), cheap = await self._submit(flight, [text], target_lang, source_lang)
+        if translated and cheap:
+            self.translator.cheap_translation_cache.set(cache_key, translated)
+        elif translated:
+            queued = self.translator.store_translation(cache_key, text, translated, target_lang, source_lang)
+            if queued >= TRANSLATION_FLUSH_SIZE:
+                self.flush_translations_soon()
+        return translated
+
+    async def _translate_segments(self, flight, cache_key, plan, target_lang, source_lang):
+        """Look every segment up in one query and batch the misses into one provider call"""
+        _, _, keys = plan
+        found = await self.run(self.translator.lookup_translations, [cache_key, *keys.values()])
+        if cache_key in found:
+            return found[cache_key]
+
+        missing = [segment for segment, key in keys.items() if key not in found]
+        results, cheap = await self._submit(flight, missing, target_lang, source_lang)
+        queued = 0
+        for segment, translated in zip(missing, results):
+            if not translated:
+                return None
+            found[keys[segment]] = translated
+            if cheap:
+                self.translator.cheap_translation_cache.set(keys[segment], translated)
+            else:
+                queued = self.translator.store_translation(keys[segment], segment, translated, target_lang, source_lang)
+        if queued >= TRANSLATION_FLUSH_SIZE:
+            self.flush_translations_soon()
+
+        translated = self.translator.assemble_segments(plan, found, missing)
+        cache = self.translator.cheap_translation_cache if cheap else self.translator.translation_cache
+        cache.set(cache_key, translated)
+        return translated
+
+    async def _submit(self, flight, texts, target_lang, source_lang):
+        """Batch `texts` in the flight's lane and tier.
+
+        Returns (results aligned with `texts`, whether any was translated on the
+        cheap tier while a billed provider could have done better). Submitted in the same loop tick, so the batcher sends them
+        together. When the flight is promoted, texts not yet with a provider are
+        moved to the new lane/tier; texts already sent are left to finish.
+        """
+        loop = asyncio.get_running_loop()
+        futures = {text: self.batcher.submit(text, target_lang, source_lang, flight.cheap, flight.lane) for text in texts}
+        cheap = dict.fromkeys(texts, flight.cheap)
+        try:
+            while True:
+                flight.promoted = loop.create_future()
+                finished = asyncio.ensure_future(asyncio.wait(futures.values()))
+                try:
+                    await asyncio.wait({finished, flight.promoted}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    finished.cancel()
+                if all(future.done() for future in futures.values()):
+                    cheap = any(cheap.values()) and self.translator.providers.billed_for(target_lang, source_lang)
+                    return [futures[text].result() for text in texts], cheap
+                for text, future in futures.items():
+                    if not self.batcher.sent(future):
+                        future.cancel()
+                        futures[text] = self.batcher.submit(text, target_lang, source_lang, flight.cheap, flight.lane)
+                        cheap[text] = flight.cheap
+        except asyncio.CancelledError:
+            for future in futures.values():
+                future.cancel()
+            raise
+
+    def flush_translations_soon(self):
+        """Start a write-behind flush unless one is already running"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.db(self.translator.flush_translations))
+
+    async def detect(self, text, timeout=DETECTION_TIMEOUT):
+        """Detect language; the offline guess is used on timeout or when it is confident enough"""
+        lang_code, _ = await self.detect_message(text, timeout=timeout)
+        return lang_code
+
+    async def detect_message(self, text, prior=None, timeout=DETECTION_TIMEOUT):
+        """(lang_code, how) where how is 'cache', 'local', 'prior', 'remote' or 'fallback'.
+
+        'fallback' is the unconfident offline guess, used when Google failed.
+
+        A `prior` (see LanguagePriors) only replaces the remote call: a
+        confident offline detection always wins over it.
+        """
+        cached = self.translator.cached_detection(text)
+        if cached:
+            return cached, 'cache'
+
+        lang_code, confidence = self.translator.detect_language_local(text)
+        if confidence >= LOCAL_DETECTION_MIN_CONFIDENCE:
+            self.translator.remember_detection(text, lang_code)
+            return lang_code, 'local'
+        if prior:
+            return prior, 'prior'
+        # Only confident offline and successful remote results are memoized; a fallback
+        # guess cached for CACHE_TTL_SECONDS would outlive a short Google outage
+        try:
+            remote_lang = await self.run(self.translator.detect_language_remote, text, timeout=timeout)
+            if remote_lang:
+                self.translator.remember_detection(text, remote_lang)
+                return remote_lang, 'remote'
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Language detection timed out after {timeout}s")
+        except Exception as e:
+            logger.error(f"Language detection error: {e}")
+        return lang_code, 'fallback'
+
+    async def db(self, func, *args, timeout=DB_TIMEOUT):
+        """Run a database helper off the event loop; None on timeout or failure"""
+        try:
+            return await self.run(func, *args, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Database call {func.__name__} timed out after {timeout}s")
+        except Exception as e:
+            logger.error(f"Database call {func.__name__} failed: {e}")
+        return None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.provider_executor.shutdown(wait=False, cancel_futures=True)
+
 # ========== BOT SETUP ==========
 intents = discord.Intents.all()
 bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
 translator = SelectiveTranslator()
+service = TranslationService(translator)
+scheduler = GuildScheduler()
+shedder = LoadShedder()
 
 # ========== HELPER FUNCTIONS ==========
-async def send_grouped_translations(message, language_groups):
-    """Send all translations in ONE embed"""
+async def send_grouped_translations(message, language_groups, source_lang, cheap=False):
+    """Send all translations in ONE embed; language_groups maps language code -> reader count"""
     try:
-        # Detect source language
-        source_lang = translator.detect_language(message.content)
+        # source_lang was detected once by on_message
         source_info = LANGUAGES.get(source_lang, {'name': source_lang.upper(), 'flag': '🌐'})
         
         # Sort languages by number of users (most users first)
-        sorted_languages = sorted(language_groups.items(), key=lambda x: len(x[1]), reverse=True)
+        sorted_languages = sorted(language_groups.items(), key=lambda x: x[1], reverse=True)
         
         # Limit translations
         sorted_languages = sorted_languages[:MAX_TRANSLATIONS_PER_MESSAGE]
@@ -552,8 +3070,25 @@ async def send_grouped_translations(message, language_groups):
         if not sorted_languages:
             return False
         
+        # Translate every language group concurrently, at most TRANSLATION_FANOUT_LIMIT at a time
+        semaphore = asyncio.Semaphore(TRANSLATION_FANOUT_LIMIT)
+
+        async def translate_group(target_lang):
+            async with semaphore:
+                return await service.translate(message.content, target_lang, source_lang, cheap=cheap)
+
+        pending_translations = {
+            target_lang: asyncio.create_task(translate_group(target_lang))
+            for target_lang, _ in sorted_languages
+        }
+        done, pending = await asyncio.wait(pending_translations.values(), timeout=FANOUT_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"⏱️ {len(pending)} translation(s) missed the {FANOUT_TIMEOUT}s deadline, sending partial results")
+
         # Count total users
-        total_users = sum(len(users) for _, users in sorted_languages)
+        total_users = 0
         
         # Create ONE embed
         embed = discord.Embed(
@@ -578,20 +3113,21 @@ async def send_grouped_translations(message, language_groups):
             inline=False
         )
         
-        # Add ALL translations to the same embed
+        # Add ALL translations to the same embed, most popular language first
         translations_added = 0
         
-        for target_lang, users in sorted_languages:
+        for target_lang, user_count in sorted_languages:
             if translations_added >= 9:  # Max 9 translations per embed
                 break
                 
-            # Translate
-            translated = translator.translate_text(message.content, target_lang, source_lang)
+            task = pending_translations[target_lang]
+            if task not in done or task.exception():
+                continue
+            translated = task.result()
             if not translated:
                 continue
             
             target_info = LANGUAGES.get(target_lang, {'name': target_lang.upper(), 'flag': '🌐'})
-            user_count = len(users)
             
             # Format translation text
             translated_display = translated
@@ -611,6 +3147,7 @@ async def send_grouped_translations(message, language_groups):
             )
             
             translations_added += 1
+            total_users += user_count
         
         # If we have translations, send the embed
         if translations_added > 0:
@@ -667,38 +3204,83 @@ async def on_message(message):
     # Check message cooldown (prevent duplicate translations)
     if not translator.check_message_cooldown(message.id):
         return
-    
+
+    translator.audience.touch(message.channel.id, message.author.id)
+
+    # Bounded pipeline - under heavy load new messages are shed instead of queued
+    if not shedder.admit():
+        return
+    try:
+        await auto_translate(message)
+    finally:
+        shedder.release()
+
+async def auto_translate(message):
+    """Detect, group and translate one message for its channel's readers"""
     logger.info(f"📨 Processing message from {message.author}")
     
-    # Detect source language
-    source_lang = translator.detect_language(message.content)
-    logger.info(f"🔍 Detected language: {source_lang}")
+    # Offline detection first; a strong author/channel prior stands in for Google when it is unsure
+    prior_lang = translator.priors.guess(message.author.id, message.channel.id, message.content)
+    audited = prior_lang is not None and translator.priors.should_audit()
+    source_lang, how = await service.detect_message(message.content, prior=None if audited else prior_lang)
+    if how == 'prior':
+        translator.priors.used()
+        logger.info(f"🔍 Assumed language from prior: {source_lang}")
+    elif how == 'fallback':
+        logger.info(f"🔍 Guessed language (detection unavailable): {source_lang}")
+    else:
+        predicted, _ = translator.priors.predict(message.author.id, message.channel.id)
+        translator.priors.record(
+            message.author.id, message.channel.id, source_lang,
+            predicted=predicted, audited=audited and how == 'remote'
+        )
+        logger.info(f"🔍 Detected language: {source_lang}")
     
-    # Get all members in the channel
+    # Group the channel's readers by language (incrementally maintained histogram)
     try:
-        if isinstance(message.channel, discord.TextChannel):
-            members = [member for member in message.channel.members if not member.bot]
-        else:
+        if not isinstance(message.channel, discord.TextChannel):
             return
         
-        # Group users by their preferred language
-        language_groups = {}
-        
-        for member in members:
-            # UPDATED: Pass guild to get_user_language for role checking
-            user_lang = translator.get_user_language(member.id, message.guild)
-            
-            # Check if we should translate for this user
-            if translator.should_translate_for_user(source_lang, user_lang, member.id, message.author.id):
-                # Add user to language group
-                if user_lang not in language_groups:
-                    language_groups[user_lang] = []
-                language_groups[user_lang].append(member.id)
-        
-        # If we have languages to translate to, send grouped translations
-        if language_groups:
-            logger.info(f"🎯 Translating to {len(language_groups)} language groups")
-            await send_grouped_translations(message, language_groups)
+        language_groups = translator.audience.language_groups(message.channel, source_lang, message.author.id)
+        if language_groups is None:
+            # First message in this channel since startup/invalidation - build it once
+            await service.db(translator.audience.build, message.channel)
+            language_groups = translator.audience.language_groups(message.channel, source_lang, message.author.id)
+        if not language_groups:
+            return
+
+        # Under load: fewer languages, then cheaper providers, then only readers active in the channel
+        level = shedder.level
+        if level >= 3:
+            language_groups = translator.audience.language_groups(
+                message.channel, source_lang, message.author.id,
+                only=translator.audience.active_members(message.channel.id)
+            )
+        if level >= 1:
+            largest = sorted(language_groups.items(), key=lambda item: item[1], reverse=True)
+            language_groups = dict(largest[:SHED_KEEP_LANGUAGES])
+        shedder.handled[level] += 1
+        if not language_groups:
+            return
+
+        # Fair share between guilds: heavy guilds get degraded, deferred or skipped translations
+        guild_id = message.guild.id
+        requests = min(len(language_groups), MAX_TRANSLATIONS_PER_MESSAGE)
+        decision = await scheduler.admit(
+            guild_id, len(message.content) * requests, requests, while_deferred=shedder.suspended
+        )
+        if decision == 'skipped':
+            logger.info(f"⏭️ Guild {guild_id} is over its translation share, skipping message")
+            return
+        if decision == 'degraded':
+            largest = sorted(language_groups.items(), key=lambda item: item[1], reverse=True)
+            language_groups = dict(largest[:GUILD_DEGRADED_LANGUAGES])
+            requests = len(language_groups)
+        scheduler.record(guild_id, len(message.content) * requests, requests)
+
+        cheap = decision == 'degraded' or level >= 2
+        logger.info(f"🎯 Translating to {len(language_groups)} language groups ({decision}, load level {level})")
+        await send_grouped_translations(message, language_groups, source_lang, cheap=cheap)
             
     except Exception as e:
         logger.error(f"Error in auto-translation: {e}")
@@ -707,21 +3289,11 @@ async def on_message(message):
 async def set_language(ctx):
     """Set your preferred language with dropdown menu - UPDATED FOR ROLE CHECKING"""
     # First check if user has a language role
-    user_lang_from_role = None
-    role_used = None
-    
-    for role in ctx.author.roles:
-        for lang_code, lang_info in LANGUAGES.items():
-            if role.name == lang_info['role_name']:
-                user_lang_from_role = lang_code
-                role_used = role
-                break
-        if user_lang_from_role:
-            break
+    role_used, user_lang_from_role = translator.role_languages.language_role(ctx.author)
     
     # If user has a language role, auto-set it
     if user_lang_from_role:
-        translator.set_user_language(ctx.author.id, user_lang_from_role)
+        await service.db(translator.set_user_language, ctx.author.id, user_lang_from_role)
         lang_info = LANGUAGES[user_lang_from_role]
         
         embed = discord.Embed(
@@ -752,7 +3324,7 @@ async def set_language(ctx):
         color=discord.Color.blue()
     )
     
-    current_lang = translator.get_user_language(ctx.author.id, ctx.guild)
+    current_lang = await service.db(translator.get_user_language, ctx.author.id, ctx.guild)
     if current_lang in LANGUAGES:
         current_info = LANGUAGES[current_lang]
         embed.add_field(
@@ -792,7 +3364,7 @@ async def toggle_auto(ctx, action: str = None):
     action = action.lower()
     
     if action == 'enable':
-        translator.enable_channel(ctx.channel.id)
+        await service.db(translator.enable_channel, ctx.channel.id)
         
         embed = discord.Embed(
             title="✅ Auto-Translate Enabled",
@@ -808,7 +3380,7 @@ async def toggle_auto(ctx, action: str = None):
         await ctx.send(embed=embed)
 
     elif action == 'disable':
-        translator.disable_channel(ctx.channel.id)
+        await service.db(translator.disable_channel, ctx.channel.id)
         
         embed = discord.Embed(
             title="❌ Auto-Translate Disabled",
@@ -887,10 +3459,10 @@ async def translate_command(ctx, target_lang: str = None, *, text: str = None):
             return
         
         # Detect source language
-        source_lang = translator.detect_language(text)
+        source_lang = await service.detect(text)
         source_info = LANGUAGES.get(source_lang, {'name': source_lang.upper(), 'flag': '🌐'})
         
-        translated = translator.translate_text(text, target_lang, source_lang)
+        translated = await service.translate(text, target_lang, source_lang, lane='interactive')
         
         if translated:
             target_info = LANGUAGES[target_lang]
@@ -938,22 +3510,56 @@ async def ping(ctx):
     
     await ctx.send(embed=embed)
 
+def format_stats(stats):
+    """Render a stats dict as embed field text"""
+    return "\n".join(f"`{key}`: {value}" for key, value in stats.items()) or "—"
+
+@bot.command(name="stats")
+@commands.has_permissions(manage_guild=True)
+async def show_stats(ctx):
+    """Show translator performance counters (admins only)"""
+    embed = discord.Embed(
+        title="📈 Translator Stats",
+        color=discord.Color.blue()
+    )
+
+    embed.add_field(name="⚙️ Worker Pool", value=format_stats(service.stats), inline=False)
+    embed.add_field(name="🚦 Priority Lanes", value=format_stats(service.lane_stats()), inline=False)
+    embed.add_field(name="📦 Batching", value=format_stats(service.batcher.stats), inline=False)
+    embed.add_field(name="🚨 Load Shedding", value=format_stats(shedder.summary()), inline=False)
+    embed.add_field(name="⚖️ Guild Fair Share", value=format_stats(scheduler.summary()), inline=False)
+    embed.add_field(name="🔌 Providers", value=format_stats(translator.providers.stats()), inline=False)
+    embed.add_field(name="🏁 Hedging", value=format_stats(translator.providers.hedge_stats), inline=False)
+    embed.add_field(name="🔍 Language Detection", value=format_stats(translator.detection_stats), inline=False)
+    embed.add_field(name="🎲 Language Priors", value=format_stats(translator.priors.stats()), inline=False)
+    embed.add_field(name="🗂️ Detection Cache", value=format_stats(translator.detection_cache.stats()), inline=False)
+    embed.add_field(name="🔒 Protected Tokens", value=format_stats(translator.placeholder_stats), inline=False)
+    embed.add_field(name="🧩 Segment Memory", value=format_stats(translator.segment_stats), inline=False)
+    embed.add_field(name="🧠 Translation Cache", value=format_stats(translator.translation_cache.stats()), inline=False)
+    embed.add_field(name="🧹 Translation Cache Table", value=format_stats(translator.cache_table_stats), inline=False)
+    embed.add_field(name="👥 User Language Index", value=format_stats(translator.user_languages.stats()), inline=False)
+    embed.add_field(name="📊 Channel Audiences", value=format_stats(translator.audience.stats()), inline=False)
+    embed.add_field(name=f"🗄️ Database ({translator.db.dialect})", value=format_stats(translator.db.stats()), inline=False)
+
+    await ctx.send(embed=embed)
+
+@bot.command(name="usage")
+@commands.has_permissions(manage_guild=True)
+async def show_usage(ctx):
+    """Show this server's share of translation capacity (admins only)"""
+    embed = discord.Embed(
+        title="⚖️ Translation Usage",
+        description=format_stats(scheduler.usage(ctx.guild.id)),
+        color=discord.Color.blue()
+    )
+    embed.set_footer(text="Over 100% load, translations use the cheapest provider and fewer languages")
+    await ctx.send(embed=embed)
+
 @bot.command(name="synclang")
 async def sync_language(ctx):
     """Sync your language preference with your current rol,es"""
-    user_lang_from_role = None
-    detected_role = None
-    
     # Find language role
-    for role in ctx.author.roles:
-        role_name = role.name
-        for lang_code, lang_info in LANGUAGES.items():
-            if role_name == lang_info['role_name']:
-                user_lang_from_role = lang_code
-                detected_role = role
-                break
-        if user_lang_from_role:
-            break
+    detected_role, user_lang_from_role = translator.role_languages.language_role(ctx.author)
     
     if not user_lang_from_role:
         embed = discord.Embed(
@@ -970,7 +3576,7 @@ async def sync_language(ctx):
         return
     
     # Set the language
-    translator.set_user_language(ctx.author.id, user_lang_from_role)
+    await service.db(translator.set_user_language, ctx.author.id, user_lang_from_role)
     lang_info = LANGUAGES[user_lang_from_role]
     
     embed = discord.Embed(
@@ -1018,32 +3624,78 @@ async def on_member_update(before, after):
         new_roles = set(after.roles) - set(before.roles)
         
         for role in new_roles:
-            role_name = role.name
             # Check if this is a language role
-            for lang_code, lang_info in LANGUAGES.items():
-                if role_name == lang_info['role_name']:
-                    # Update user's language preference
-                    translator.set_user_language(after.id, lang_code)
-                    
-                    # Log it
-                    logger.info(f"🔄 Auto-set language for {after.name} to {lang_code} from role: {role_name}")
-                    
-                    # Send notification if possible
-                    try:
-                        embed = discord.Embed(
-                            title="🌍 Language Preference Updated",
-                            description=f"Your language preference has been automatically set to **{lang_info['name']}!**",
-                            color=discord.Color.green()
-                        )
-                        embed.add_field(
-                            name="What this means:",
-                            value="• Messages will be auto-translated to your language\n• Use `!mylang` to change if needed",
-                            inline=False
-                        )
-                        await after.send(embed=embed)
-                    except:
-                        pass  # User might have DMs disabled
-                    break
+            lang_code = translator.role_languages.language_of(role)
+            if not lang_code:
+                continue
+            lang_info = LANGUAGES[lang_code]
+
+            # Update user's language preference
+            await service.db(translator.set_user_language, after.id, lang_code)
+            
+            # Log it
+            logger.info(f"🔄 Auto-set language for {after.name} to {lang_code} from role: {role.name}")
+            
+            # Send notification if possible
+            try:
+                embed = discord.Embed(
+                    title="🌍 Language Preference Updated",
+                    description=f"Your language preference has been automatically set to **{lang_info['name']}!**",
+                    color=discord.Color.green()
+                )
+                embed.add_field(
+                    name="What this means:",
+                    value="• Messages will be auto-translated to your language\n• Use `!mylang` to change if needed",
+                    inline=False
+                )
+                await after.send(embed=embed)
+            except:
+                pass  # User might have DMs disabled
+
+        # Language or channel visibility may have changed
+        await service.db(translator.audience.update_member, after)
+
+@bot.event
+async def on_member_join(member):
+    """Add new members to the language audience of the channels they can read"""
+    await service.db(translator.audience.update_member, member)
+
+@bot.event
+async def on_member_remove(member):
+    translator.audience.remove_member(member.guild.id, member.id)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    """Permission edits change who reads a channel - rebuild its audience lazily"""
+    if before.overwrites != after.overwrites:
+        translator.audience.invalidate(after.id)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    translator.audience.invalidate(channel.id)
+
+@bot.event
+async def on_guild_role_create(role):
+    """Keep the role → language index current"""
+    translator.role_languages.build(role.guild)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if before.name != after.name:
+        translator.role_languages.build(after.guild)
+        translator.audience.invalidate_guild(after.guild.id)
+    elif before.permissions != after.permissions:
+        translator.audience.invalidate_guild(after.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    translator.role_languages.build(role.guild)
+    translator.audience.invalidate_guild(role.guild.id)
+
+@bot.event
+async def on_guild_remove(guild):
+    translator.role_languages.forget(guild.id)
+    translator.audience.invalidate_guild(guild.id)
 
 
 
@@ -1137,13 +3789,85 @@ class Welcome(commands.Cog):
             await ctx.send("❌ You need administrator permission to use this command.")
 
 # ========END=========
+@tasks.loop(minutes=SQLITE_MAINTENANCE_MINUTES)
+async def storage_maintenance():
+    """Periodic WAL checkpoint and vacuum for the SQLite backend"""
+    try:
+        await asyncio.to_thread(translator.db.maintenance)
+    except Exception as e:
+        logger.error(f"SQLite maintenance error: {e}")
+
+@tasks.loop(seconds=max(CHANNEL_RECONCILE_SECONDS, 1))
+async def channel_reconcile():
+    """Pick up channel_settings changes made by other replicas"""
+    await service.db(translator.reload_channel_settings)
+
+@tasks.loop(seconds=TRANSLATION_FLUSH_SECONDS)
+async def translation_flush():
+    """Write-behind: persist queued translation_cache rows in batches"""
+    await service.db(translator.flush_translations)
+
+@tasks.loop(minutes=CACHE_PURGE_MINUTES)
+async def cache_purge():
+    """Delete expired translation_cache rows and refresh the table size report"""
+    await asyncio.to_thread(translator.purge_translation_cache)
+
+@tasks.loop(seconds=USER_PREF_FLUSH_SECONDS)
+async def preference_flush():
+    """Coalesce role-derived language changes into periodic batched upserts"""
+    await service.db(translator.flush_user_languages)
+
+@tasks.loop(minutes=DEEPL_USAGE_REFRESH_MINUTES)
+async def deepl_usage_refresh():
+    """Correct local character accounting against DeepL's own counter"""
+    try:
+        await service.run(translator.deepl_provider.refresh_usage, timeout=DEEPL_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"DeepL usage refresh failed: {e}")
+
+@tasks.loop(seconds=LOOP_LAG_INTERVAL)
+async def loop_lag_monitor():
+    """Sample event-loop lag: how long a ready callback waits for its turn"""
+    start = time.monotonic()
+    await asyncio.sleep(0)
+    shedder.observe_lag(time.monotonic() - start)
+
 async def setup_hook():
     await bot.add_cog(Welcome(bot))
+    if translator.db.dialect == 'sqlite':
+        storage_maintenance.start()
+    if CHANNEL_RECONCILE_SECONDS > 0:
+        channel_reconcile.start()
+    preference_flush.start()
+    translation_flush.start()
+    cache_purge.start()
+    loop_lag_monitor.start()
+    if translator.deepl_provider:
+        deepl_usage_refresh.start()
     # Optional: print loaded commands for debugging
     print("✅ Cog added. Loaded commands:", [cmd.name for cmd in bot.commands])
 
 bot.setup_hook = setup_hook
 
+_discord_close = bot.close
+
+async def close():
+    """Release shared resources before disconnecting"""
+    storage_maintenance.cancel()
+    channel_reconcile.cancel()
+    preference_flush.cancel()
+    translation_flush.cancel()
+    cache_purge.cancel()
+    deepl_usage_refresh.cancel()
+    loop_lag_monitor.cancel()
+    await service.db(translator.flush_user_languages)
+    await service.db(translator.flush_translations)
+    service.shutdown()
+    translator.db.close()
+    await _discord_close()
+
+bot.close = close
+
 # ========== CONTEXT MENU TRANSLATION ==========
 @bot.tree.context_menu(name="Translate to my language")
 async def translate_context_menu(interaction: discord.Interaction, message: discord.Message):
@@ -1151,13 +3875,13 @@ async def translate_context_menu(interaction: discord.Interaction, message: disc
     await interaction.response.defer(ephemeral=True, thinking=True)
 
     # Get user's language from their role
-    user_lang = translator.get_user_language(interaction.user.id, interaction.guild)
+    user_lang = await service.db(translator.get_user_language, interaction.user.id, interaction.guild) or 'en'
 
     # Detect source language
-    source_lang = translator.detect_language(message.content)
+    source_lang = await service.detect(message.content)
 
-    # Translate (uses DeepL → Google fallback)
-    translated = translator.translate_text(message.content, user_lang, source_lang)
+    # Translate (uses DeepL → Google fallback) off the event loop
+    translated = await service.translate(message.content, user_lang, source_lang, lane='interactive')
 
     if translated:
         lang_info = LANGUAGES.get(user_lang, {'flag': '🌐', 'name': user_lang.upper()})
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+import googletrans
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class OfflineTranslator:
+    """Stands in for the Google client so importing bot never opens a network session."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def translate(self, *args, **kwargs):
+        raise RuntimeError("network access is disabled in tests")
+
+    detect = translate
+
+
+def _import_bot():
+    """Import bot once with its module-level translator built against a throwaway SQLite file."""
+    for name in ('DATABASE_URL', 'DEEPL_API_KEY'):
+        os.environ.pop(name, None)
+    googletrans.Translator = OfflineTranslator
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix='meow-tests-'))
+    try:
+        import bot  # noqa: F401
+    finally:
+        os.chdir(cwd)
+
+
+_import_bot()
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def detector():
+    return bot.LocalLanguageDetector()
+
+
+@pytest.mark.parametrize('text, lang_code', [
+    ("Hello everyone, how are you doing today?", 'en'),
+    ("Bonjour à tous, comment allez-vous aujourd'hui ?", 'fr'),
+    ("Hallo zusammen, wie geht es euch heute?", 'de'),
+    ("Hola a todos, ¿cómo están hoy?", 'es'),
+    ("Xin chào mọi người, hôm nay thế nào?", 'vi'),
+])
+def test_latin_text_is_detected_confidently(detector, text, lang_code):
+    detected, confidence = detector.detect(text)
+    assert detected == lang_code
+    assert confidence >= bot.LOCAL_DETECTION_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize('text, lang_code', [
+    ("Привет всем, как дела?", 'ru'),
+    ("안녕하세요 여러분", 'ko'),
+    ("こんにちは、げんきですか", 'ja'),
+    ("大家好", 'zh'),
+    ("مرحبا بالجميع", 'ar'),
+])
+def test_known_scripts_are_classified_by_range(detector, text, lang_code):
+    assert detector.detect(text) == (lang_code, 1.0)
+
+
+@pytest.mark.parametrize('text', [
+    "Γεια σας σε όλους, τι κάνετε;",  # Greek
+    "שלום לכולם",  # Hebrew
+    "সবাইকে শুভেচ্ছা",  # Bengali
+    "Բարև բոլորին",  # Armenian
+])
+def test_unknown_text_has_no_confidence(detector, text):
+    assert detector.detect(text) == ('auto', 0.0)
+
+
+def test_text_without_letters_is_not_detected(detector):
+    assert detector.detect("👍 123 !!!") == (None, 0.0)
+    assert bot.translator.detect_language_local("👍 123 !!!") == ('en', 1.0)
+
+
+def test_unknown_script_goes_to_the_remote_detector(monkeypatch):
+    service = bot.TranslationService(bot.translator)
+    calls = []
+
+    def remote(text):
+        calls.append(text)
+        return 'el'
+
+    monkeypatch.setattr(bot.translator, 'detect_language_remote', remote)
+    text = "Γεια σας σε όλους, τι κάνετε σήμερα;"
+    assert asyncio.run(service.detect_message(text)) == ('el', 'remote')
+    assert calls == [text]
+
+
+def _priors_for(detector, lang_code):
+    priors = bot.LanguagePriors(detector)
+    for _ in range(bot.PRIOR_MIN_SAMPLES):
+        priors.record(1, 10, lang_code)
+    return priors
+
+
+def test_prior_stands_in_when_the_offline_detector_agrees(detector):
+    priors = _priors_for(detector, 'no')
+    assert priors.guess(2, 10, "Jeg tror vi skal gå til arrangementet i aften") == 'no'
+
+
+@pytest.mark.parametrize('text', [
+    "Acho que devemos ir ao evento hoje à noite",
+    "Jeg tror vi skal gå til arrangementet i aften",
+    "Γεια σας σε όλους",
+])
+def test_prior_does_not_override_a_different_offline_guess(detector, text):
+    priors = _priors_for(detector, 'en')
+    assert priors.guess(2, 10, text) is None
+    assert priors.stats()['detector_disagreed'] == 1
+
+
+def test_prior_histories_are_bounded(detector, monkeypatch):
+    monkeypatch.setattr(bot, 'PRIOR_MAX_AUTHORS', 3)
+    monkeypatch.setattr(bot, 'PRIOR_MAX_CHANNELS', 2)
+    priors = bot.LanguagePriors(detector)
+    for author_id in range(10):
+        priors.record(author_id, author_id, 'en')
+    assert priors.stats()['authors'] == 3
+    assert priors.stats()['channels'] == 2
+    assert priors.predict(9, 9) == (None, 0.0)  # Too few samples, but still remembered
+    assert len(priors._authors.get(9)) == 1
@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import pytest
+
+import bot
+
+
+class FakeProvider(bot.TranslationProvider):
+    timeout = 5
+
+    def __init__(self, name, delay=0.0, fail=False, weight=1.0, rate=None):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.weight = weight
+        self.rate_per_second = rate
+        self.calls = 0
+
+    def translate_batch(self, texts, target_lang, source_lang):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return [f"{self.name}:{text}" for text in texts]
+
+
+async def run(func, *args, timeout=None):
+    return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout)
+
+
+@pytest.fixture(autouse=True)
+def deterministic_routing(monkeypatch):
+    monkeypatch.setattr(bot, 'PROVIDER_PROBE_RATE', 0)
+
+
+def test_open_breaker_does_not_spend_rate_limit_tokens():
+    provider = FakeProvider('limited', rate=1)
+    chain = bot.ProviderChain([provider])
+    chain.breakers['limited']._open()
+
+    assert chain.acquire(provider, ["hello"]) is None
+    assert chain.limiters['limited'].tokens == 1
+
+
+def test_rate_limit_wait_is_not_recorded_as_latency(monkeypatch):
+    monkeypatch.setattr(bot, 'RATE_LIMIT_MAX_WAIT', 1.0)
+    provider = FakeProvider('limited', rate=4)
+    chain = bot.ProviderChain([provider])
+    chain.limiters['limited'].tokens = 0  # The next call waits ~0.25s for a token
+
+    assert asyncio.run(chain.call(provider, ["hello"], 'fr', 'en', run)) == ["limited:hello"]
+    assert chain._health['limited'].percentile(50) < 0.1
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = bot.CircuitBreaker(failures=3, cooldown=60)
+    for _ in range(2):
+        breaker.record(False, 0.1)
+    breaker.record(True, 0.1)  # A success resets the streak
+    for _ in range(3):
+        assert breaker.acquire()
+        breaker.record(False, 0.1)
+
+    assert breaker.state == 'open'
+    assert breaker.trips == 1
+    assert not breaker.available()
+    assert not breaker.acquire()
+
+
+def test_breaker_opens_after_consecutive_slow_calls():
+    breaker = bot.CircuitBreaker(slow_calls=2, slow_seconds=1.0)
+    breaker.record(True, 2.0)
+    assert breaker.state == 'closed'
+    breaker.record(True, 0.1, slow=True)  # e.g. a lost hedge
+    assert breaker.state == 'open'
+
+
+@pytest.mark.parametrize('ok, latency, state', [(True, 0.1, 'closed'), (False, 0.1, 'open'), (True, 5.0, 'open')])
+def test_half_open_trial_decides_the_next_state(ok, latency, state):
+    breaker = bot.CircuitBreaker(failures=1, slow_seconds=1.0, cooldown=0)
+    breaker.record(False, 0.1)
+    assert breaker.state == 'open'
+
+    assert breaker.acquire()
+    assert breaker.state == 'half-open'
+    assert not breaker.acquire()  # Only one trial at a time
+    breaker.record(ok, latency)
+    assert breaker.state == state
+
+
+def test_released_trial_lets_another_call_through():
+    breaker = bot.CircuitBreaker(failures=1, cooldown=0)
+    breaker.record(False, 0.1)
+    assert breaker.acquire()
+    breaker.release()
+    assert breaker.acquire()
+
+
+def test_token_bucket_waits_then_refuses():
+    bucket = bot.TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() is None  # Empty and not allowed to wait
+    wait = bucket.reserve(max_wait=1.0)
+    assert 0.05 < wait <= 0.1
+    assert bucket.reserve(max_wait=0.05) is None
+
+
+def test_chain_falls_back_when_the_first_provider_fails():
+    broken = FakeProvider('broken', fail=True, weight=10)
+    backup = FakeProvider('backup')
+    chain = bot.ProviderChain([broken, backup])
+
+    results = asyncio.run(chain.translate(["hi"], 'fr', 'en', run))
+    assert results == ["backup:hi"]
+    assert (broken.calls, backup.calls) == (1, 1)
+
+
+def test_chain_routes_around_an_open_circuit_and_by_latency():
+    slow = FakeProvider('slow', weight=2)
+    fast = FakeProvider('fast')
+    chain = bot.ProviderChain([slow, fast])
+    for _ in range(bot.PROVIDER_MIN_SAMPLES):
+        chain.record(slow, 'fr', 'en', True, 2.0)
+        chain.record(fast, 'fr', 'en', True, 0.2)
+    assert [provider.name for provider in chain.route('fr', 'en')] == ['fast', 'slow']
+
+    chain.breakers['fast']._open()
+    assert [provider.name for provider in chain.route('fr', 'en')] == ['slow']
+
+
+def test_cheap_route_skips_billed_providers():
+    billed = FakeProvider('billed', weight=10)
+    billed.billed = True
+    free = FakeProvider('free')
+    chain = bot.ProviderChain([billed, free])
+
+    assert asyncio.run(chain.translate(["hi"], 'fr', 'en', run, cheap=True)) == ["free:hi"]
+    assert billed.calls == 0
+
+
+def test_hedge_backup_wins_and_the_loser_is_recorded_as_slow(monkeypatch):
+    monkeypatch.setattr(bot, 'HEDGE_MIN_DELAY', 0.05)
+    stalled = FakeProvider('stalled', delay=0.5)
+    stalled.expected_latency = 0.01
+    backup = FakeProvider('backup')
+    chain = bot.ProviderChain([stalled, backup])
+
+    results, winner, hedged = asyncio.run(chain.hedged_call(stalled, backup, ["hi"], 'fr', 'en', run))
+    assert (results, winner, hedged) == (["backup:hi"], 'backup', True)
+    assert chain.hedge_stats['backup_wins'] == 1
+    assert chain._calls['stalled']['abandoned'] == 1
+    assert chain.breakers['stalled'].slow == 1
+    assert (chain._calls['backup']['calls'], chain._calls['backup']['abandoned']) == (1, 0)
+
+
+def test_fast_primary_is_not_hedged(monkeypatch):
+    monkeypatch.setattr(bot, 'HEDGE_MIN_DELAY', 0.2)
+    primary = FakeProvider('primary')
+    backup = FakeProvider('backup')
+    chain = bot.ProviderChain([primary, backup])
+
+    result = asyncio.run(chain.hedged_call(primary, backup, ["hi"], 'fr', 'en', run))
+    assert result == (["primary:hi"], 'primary', False)
+    assert backup.calls == 0
+    assert chain.hedge_stats['hedged'] == 0
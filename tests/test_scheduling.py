@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+
+
+def test_gate_serves_interactive_waiters_first():
+    gate = bot.PriorityGate(limit=1)
+    order = []
+
+    async def job(name, lane):
+        async with gate.slot(lane):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await gate.acquire('auto')  # Hold the only slot while the others queue
+        jobs = [asyncio.create_task(job(f"auto-{i}", 'auto')) for i in range(3)]
+        jobs.append(asyncio.create_task(job("interactive", 'interactive')))
+        await asyncio.sleep(0)
+        assert gate.waiting == {'interactive': 1, 'auto': 3}
+        gate.release()
+        await asyncio.gather(*jobs)
+
+    asyncio.run(main())
+    assert order == ["interactive", "auto-0", "auto-1", "auto-2"]
+    assert gate.active == 0
+
+
+def test_gate_passes_on_a_slot_handed_to_a_cancelled_waiter():
+    gate = bot.PriorityGate(limit=1)
+
+    async def main():
+        await gate.acquire('auto')
+        first = asyncio.create_task(gate.acquire('auto'))
+        second = asyncio.create_task(gate.acquire('auto'))
+        await asyncio.sleep(0)
+        gate.release()  # Hands the slot to `first`...
+        first.cancel()  # ...which gives up before it runs
+        await asyncio.sleep(0)
+        await second
+        assert gate.active == 1
+        assert gate.waiting == {'interactive': 0, 'auto': 0}
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def scheduler():
+    return bot.GuildScheduler(window=60, max_chars=1000, max_requests=100)
+
+
+def test_guild_within_its_share_is_translated_fully(scheduler):
+    scheduler.record(1, 400, 10)
+    scheduler.record(2, 100, 1)
+    assert scheduler.decide(1, 50, 1) == 'full'  # 450 of a 500 share
+
+
+@pytest.mark.parametrize('chars, decision', [(600, 'degraded'), (900, 'deferred'), (1400, 'skipped')])
+def test_guild_over_its_share_is_degraded_deferred_then_skipped(scheduler, chars, decision):
+    scheduler.record(2, 10, 1)  # Another active guild halves the share to 500 characters
+    scheduler.record(1, chars, 1)
+    assert scheduler.decide(1, 0, 0) == decision
+
+
+def test_guild_weights_split_capacity(scheduler):
+    scheduler.weights = {1: 3}
+    scheduler.record(2, 10, 1)
+    assert scheduler.share(1) == 0.75
+    scheduler.record(1, 700, 1)
+    assert scheduler.decide(1, 0, 0) == 'full'
+
+
+def test_deferred_guild_releases_its_resources_while_waiting(scheduler, monkeypatch):
+    monkeypatch.setattr(bot, 'GUILD_DEFER_MAX_SECONDS', 0)
+    scheduler.record(2, 10, 1)
+    scheduler.record(1, 900, 1)
+    suspended = []
+
+    class Suspend:
+        async def __aenter__(self):
+            suspended.append(True)
+
+        async def __aexit__(self, *exc):
+            return False
+
+    assert asyncio.run(scheduler.admit(1, 0, 0, while_deferred=Suspend)) == 'degraded'
+    assert suspended == [True]
+    assert scheduler.stats['deferred'] == 1
+
+
+class EchoChain:
+    def __init__(self):
+        self.calls = []
+
+    async def translate(self, texts, target_lang, source_lang, run, cheap=False):
+        self.calls.append((list(texts), target_lang, cheap))
+        return [f"{target_lang}:{text}" for text in texts]
+
+
+@pytest.fixture
+def batcher():
+    chain = EchoChain()
+    service = SimpleNamespace(gate=bot.PriorityGate(), translator=SimpleNamespace(providers=chain), run_provider=None)
+    return bot.TranslationBatcher(service, window=0.02, max_size=3)
+
+
+def test_batcher_groups_texts_per_pair(batcher):
+    async def main():
+        futures = [batcher.submit(text, lang, 'en') for lang in ('fr', 'de') for text in ("a", "b", "a")]
+        return await asyncio.gather(*futures)
+
+    assert asyncio.run(main()) == ["fr:a", "fr:b", "fr:a", "de:a", "de:b", "de:a"]
+    calls = batcher.service.translator.providers.calls
+    assert sorted(calls) == [(["a", "b"], 'de', False), (["a", "b"], 'fr', False)]  # Duplicates sent once
+    assert batcher.stats['size_flushes'] == 2
+
+
+def test_batcher_drops_cancelled_texts(batcher):
+    async def main():
+        kept = batcher.submit("kept", 'fr', 'en')
+        batcher.submit("dropped", 'fr', 'en').cancel()
+        gone = batcher.submit("gone", 'de', 'en')
+        gone.cancel()
+        assert await kept == "fr:kept"
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert batcher.service.translator.providers.calls == [(["kept"], 'fr', False)]
+    assert batcher.stats['abandoned'] == 1
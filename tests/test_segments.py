@@ -0,0 +1,24 @@
+import pytest
+
+import bot
+
+
+@pytest.mark.parametrize('text, segments', [
+    ("Hello there. How are you? Fine!", ["Hello there.", "How are you?", "Fine!"]),
+    ("Mr. Smith went home. He was tired.", ["Mr. Smith went home.", "He was tired."]),
+    ("Bring snacks, e.g. chips or fruit. Thanks", ["Bring snacks, e.g. chips or fruit.", "Thanks"]),
+    ("Written by J. R. R. Tolkien. A classic.", ["Written by J. R. R. Tolkien.", "A classic."]),
+    ("It costs approx. ten dollars.", ["It costs approx. ten dollars."]),
+    ("First line\nsecond line", ["First line", "second line"]),
+    ("会議は明日です。 よろしく。", ["会議は明日です。", "よろしく。"]),
+])
+def test_split_segments(text, segments):
+    assert bot.split_segments(text)[0] == segments
+
+
+@pytest.mark.parametrize('text', [
+    "Mr. Smith went home.  He was tired.\n\nSee you e.g. tomorrow!",
+    "\nLeading break. Then text",
+])
+def test_segments_reassemble_exactly(text):
+    assert bot.join_segments(*bot.split_segments(text)) == text
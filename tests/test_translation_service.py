@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+import bot
+
+
+class FakeProvider(bot.TranslationProvider):
+    name = 'fake'
+    timeout = 5
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def translate_batch(self, texts, target_lang, source_lang):
+        self.calls.append(list(texts))
+        time.sleep(self.delay)
+        return [f"[{target_lang}]{text}" for text in texts]
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setattr(bot, 'HEDGE_ENABLED', False)
+    monkeypatch.setattr(bot, 'PROVIDER_PROBE_RATE', 0)
+    monkeypatch.setattr(bot.translator, 'providers', bot.ProviderChain([provider]))
+    monkeypatch.setattr(bot.translator, 'translation_cache', bot.TTLCache())
+    return provider
+
+
+@pytest.fixture
+def service(provider):
+    service = bot.TranslationService(bot.translator)
+    yield service
+    service.shutdown()
+
+
+def test_abandoned_flights_leave_the_gate_and_batcher(service, provider):
+    provider.delay = 0.5
+    service.gate.limit = 1
+
+    async def main():
+        hog = asyncio.create_task(service.translate("keep the provider busy", 'de', 'en'))
+        await asyncio.sleep(0.05)
+        results = await asyncio.gather(*(
+            service.translate(f"message number {i} for everyone", 'fr', 'en', timeout=0.2) for i in range(10)
+        ))
+        await asyncio.sleep(0.01)  # Let the cancellations reach the gate
+        assert results == [None] * 10
+        assert len(service._inflight) == 1  # Only the busy flight is left
+        assert service.gate.waiting == {lane: 0 for lane in bot.LANES}
+        assert await hog == "[de]keep the provider busy"
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert provider.calls == [["keep the provider busy"]]
+    assert service.batcher.stats['abandoned'] >= 1
+
+
+def test_requests_in_different_lanes_and_tiers_share_one_call(service, provider):
+    text = "good morning to everyone here"
+
+    async def main():
+        return await asyncio.gather(
+            service.translate(text, 'fr', 'en', cheap=True),
+            service.translate(text, 'fr', 'en', lane='interactive'),
+            service.translate(text, 'fr', 'en'),
+        )
+
+    assert asyncio.run(main()) == [f"[fr]{text}"] * 3
+    assert provider.calls == [[text]]
+    assert service.stats['coalesced'] == 2
+
+
+def test_interactive_request_promotes_a_queued_flight(service, provider):
+    provider.delay = 0.1
+    service.gate.limit = 1
+
+    async def main():
+        hog = asyncio.create_task(service.translate("hold the only provider slot", 'de', 'en'))
+        await asyncio.sleep(0.05)
+        queued = [asyncio.create_task(service.translate(f"queued for {lang}", lang, 'en')) for lang in ('fr', 'es', 'it')]
+        await asyncio.sleep(bot.BATCH_WINDOW_SECONDS + 0.01)  # All three now wait at the provider gate
+        interactive = service.translate("queued for it", 'it', 'en', lane='interactive')
+        assert await interactive == "[it]queued for it"
+        await asyncio.gather(hog, *queued)
+
+    asyncio.run(main())
+    assert provider.calls[:2] == [["hold the only provider slot"], ["queued for it"]]
+    assert len(provider.calls) == 4
+
+
+class BilledProvider(FakeProvider):
+    name = 'billed'
+    weight = 10
+    billed = True
+
+    def translate_batch(self, texts, target_lang, source_lang):
+        self.calls.append(list(texts))
+        return [f"<{target_lang}>{text}" for text in texts]
+
+
+def test_cheap_translations_are_not_persisted(service, provider, monkeypatch):
+    billed = BilledProvider()
+    bot.translator.providers.add(billed)
+    monkeypatch.setattr(bot.translator, '_pending_translations', {})
+    text = "see you all at the meeting"
+    cache_key = bot.translator._cache_key(text, 'fr', 'en')
+
+    async def main():
+        assert await service.translate(text, 'fr', 'en', cheap=True) == f"[fr]{text}"
+        assert bot.translator.translation_cache.get(cache_key) is None
+        assert cache_key not in bot.translator._pending_translations
+        assert await service.translate(text, 'fr', 'en', cheap=True) == f"[fr]{text}"  # Served from memory
+        assert await service.translate(text, 'fr', 'en', lane='interactive') == f"<fr>{text}"
+        assert await service.translate(text, 'fr', 'en', cheap=True) == f"<fr>{text}"
+
+    asyncio.run(main())
+    assert provider.calls == [[text]]
+    assert billed.calls == [[text]]
+    assert cache_key in bot.translator._pending_translations
+
+
+def test_cheap_route_is_persisted_without_a_billed_provider(service, provider, monkeypatch):
+    monkeypatch.setattr(bot.translator, '_pending_translations', {})
+    text = "the server restarts tonight"
+
+    asyncio.run(service.translate(text, 'fr', 'en', cheap=True))
+    assert bot.translator._cache_key(text, 'fr', 'en') in bot.translator._pending_translations